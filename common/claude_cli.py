@@ -0,0 +1,104 @@
+"""預熱的 Claude CLI 行程池。
+
+每個 prompt 仍交給獨立的 `claude -p` 行程（prompt 從 stdin 傳入），但行程事先啟動、
+在 stdin 上等待，CLI 的啟動與初始化在上一次呼叫進行時就已完成。
+
+不使用 stream-json 的長駐模式：同一個 session 會累積先前所有對話，後面的 prompt
+會看到前面的內容，token 用量也會持續增加；一個 prompt 一個行程才能保持呼叫彼此獨立。
+"""
+
+import atexit
+import os
+import re
+import subprocess
+import threading
+import time
+
+_ANSI_RE = re.compile(r"\x1b\[[0-9;]*[mGKHFABCDJKsuhl]|\r")
+
+# 閒置太久的預熱行程直接換掉，避免拿到狀態過期（例如認證過期）的行程
+MAX_IDLE_SECONDS = 600
+
+
+def cli_env() -> dict:
+    env = os.environ.copy()
+    env["PATH"] = "/opt/homebrew/bin:/usr/local/bin:" + env.get("PATH", "")
+    return env
+
+
+def clean_output(text: str) -> str:
+    return _ANSI_RE.sub("", text).strip()
+
+
+class ClaudeCliPool:
+    def __init__(self, size: int = 2, model: str = "sonnet") -> None:
+        self.size = max(1, size)
+        self.model = model
+        self._env = cli_env()
+        self._idle: list[tuple[subprocess.Popen, float]] = []
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _spawn(self) -> subprocess.Popen:
+        return subprocess.Popen(
+            ["claude", "-p", "--model", self.model],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            env=self._env,
+        )
+
+    def _take(self) -> tuple[subprocess.Popen, bool]:
+        """取出一個健康的預熱行程；沒有時啟動新的。回傳 (行程, 是否為預熱行程)。"""
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                proc, spawned_at = self._idle.pop(0)
+                if proc.poll() is None and now - spawned_at < MAX_IDLE_SECONDS:
+                    return proc, True
+                _terminate(proc)
+        return self._spawn(), False
+
+    def _replenish(self) -> None:
+        with self._lock:
+            while len(self._idle) < self.size:
+                self._idle.append((self._spawn(), time.monotonic()))
+
+    def run(self, prompt: str, timeout: int = 120) -> str:
+        proc, warm = self._take()
+        self._replenish()
+        try:
+            return self._communicate(proc, prompt, timeout)
+        except RuntimeError:
+            if not warm:
+                raise
+        # 預熱行程執行失敗時，用全新行程重試一次
+        return self._communicate(self._spawn(), prompt, timeout)
+
+    @staticmethod
+    def _communicate(proc: subprocess.Popen, prompt: str, timeout: int) -> str:
+        try:
+            stdout, stderr = proc.communicate(prompt, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            raise
+        if proc.returncode != 0:
+            raise RuntimeError(f"Claude CLI error: {clean_output(stderr)}")
+        return clean_output(stdout)
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for proc, _ in idle:
+            _terminate(proc)
+
+
+def _terminate(proc: subprocess.Popen) -> None:
+    if proc.poll() is None:
+        proc.terminate()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
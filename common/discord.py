@@ -0,0 +1,335 @@
+"""Discord REST API 用戶端：keep-alive session + 依 bucket 的主動速率限制。
+
+Discord 以 bucket 為單位限制請求，每個回應都帶有：
+  X-RateLimit-Bucket        這個 route 所屬的 bucket
+  X-RateLimit-Remaining     目前視窗剩餘的請求數
+  X-RateLimit-Reset-After   視窗重置前的秒數
+  X-RateLimit-Reset         視窗重置的時間點（用來辨識回應屬於哪個視窗）
+同一 bucket 的 remaining 用完時，在送出下一個請求前先等到重置，而不是等 429 發生；
+視窗重置後先送一個請求取得新的額度，其餘請求等它回來再依 remaining 放行。
+bucket 另依 major parameter（channel / guild / webhook id）區分。
+
+全域上限（每個 bot 每秒 50 個請求）以 TokenBucket 控制；收到 global 429 時所有請求一起暫停。
+
+ReactionDispatcher 把 reaction 排入背景 worker 送出，重複的合併、失敗的彙整成一則訊息回報。
+"""
+
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from common.ratelimit import TokenBucket
+
+DISCORD_API = "https://discord.com/api/v10"
+GLOBAL_RATE_LIMIT = 50.0
+
+_MAJOR_RE = re.compile(r"^/(channels|guilds|webhooks)/(\d+)")
+_ID_RE = re.compile(r"/\d{15,}")
+_REACTION_RE = re.compile(r"/reactions/[^/]+")
+
+
+def route_key(method: str, path: str) -> tuple[str, str]:
+    """回傳 (route, major parameter)；route 中除 major parameter 以外的 id 都換成 :id。"""
+    m = _MAJOR_RE.match(path)
+    major = m.group(2) if m else ""
+    rest = path[m.end():] if m else path
+    rest = _REACTION_RE.sub("/reactions/:emoji", _ID_RE.sub("/:id", rest))
+    prefix = f"/{m.group(1)}/:major" if m else ""
+    return f"{method} {prefix}{rest}", major
+
+
+# 視窗重置後只放行一個探測請求，其餘等它帶回新的 header；探測逾時則再放行一個
+_PROBE_TIMEOUT = 5.0
+
+
+@dataclass
+class _Bucket:
+    remaining: int = 0
+    reset_at: float = 0.0
+    # 目前視窗的識別（X-RateLimit-Reset），用來忽略上一個視窗遲到的回應
+    window: float = 0.0
+    probe_started: float | None = None
+    cond: threading.Condition = field(default_factory=threading.Condition, repr=False)
+
+    def acquire(self) -> None:
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                if self.remaining > 0 and self.reset_at > now:
+                    self.remaining -= 1
+                    return
+                if self.remaining <= 0 and self.reset_at > now:
+                    self.cond.wait(self.reset_at - now)
+                    continue
+                if self.probe_started is None or now - self.probe_started > _PROBE_TIMEOUT:
+                    self.probe_started = now
+                    return
+                self.cond.wait(_PROBE_TIMEOUT)
+
+    def update(self, remaining: int, reset_after: float, window: float, received: float) -> None:
+        with self.cond:
+            if window < self.window:
+                return
+            if window > self.window:
+                self.window = window
+                self.remaining = remaining
+            else:
+                # 同一個視窗內還有其他請求在途中，只能往下修正
+                self.remaining = min(self.remaining, remaining)
+            self.reset_at = received + reset_after
+            self.probe_started = None
+            self.cond.notify_all()
+
+    def release(self) -> None:
+        """請求沒帶回速率限制資訊（網路錯誤等）時結束探測，讓下一個請求接手。"""
+        with self.cond:
+            self.probe_started = None
+            self.cond.notify_all()
+
+
+class DiscordClient:
+    def __init__(
+        self,
+        token: str,
+        user_agent: str = "tools-bot/1.0",
+        timeout: float = 30,
+        max_retries: int = 5,
+        log: Callable[[str], None] = print,
+    ) -> None:
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.log = log
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+        self.session.headers.update({"Authorization": f"Bot {token}", "User-Agent": user_agent})
+        self._global = TokenBucket(GLOBAL_RATE_LIMIT)
+        self._route_buckets: dict[str, str] = {}
+        self._buckets: dict[tuple[str, str], _Bucket] = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self) -> None:
+        self.session.close()
+
+    def _bucket(self, route: str, major: str) -> _Bucket:
+        with self._lock:
+            # 還不知道 bucket hash 前，先以 route 本身當 key
+            key = (self._route_buckets.get(route, route), major)
+            if key not in self._buckets:
+                self._buckets[key] = _Bucket()
+            return self._buckets[key]
+
+    def _update_bucket(self, route: str, major: str, resp: requests.Response) -> None:
+        received = time.monotonic()
+        headers = resp.headers
+        bucket_hash = headers.get("X-RateLimit-Bucket")
+        if bucket_hash:
+            with self._lock:
+                if self._route_buckets.get(route) != bucket_hash:
+                    self._route_buckets[route] = bucket_hash
+                    self._buckets.setdefault((bucket_hash, major), self._buckets.pop((route, major), _Bucket()))
+        try:
+            remaining = int(headers["X-RateLimit-Remaining"])
+            reset_after = float(headers["X-RateLimit-Reset-After"])
+            window = float(headers.get("X-RateLimit-Reset") or received + reset_after)
+        except (KeyError, ValueError):
+            self._bucket(route, major).release()
+            return
+        self._bucket(route, major).update(remaining, reset_after, window, received)
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """送出請求並處理速率限制與 5xx / 網路錯誤的重試；其他狀態碼直接回傳給呼叫端。"""
+        route, major = route_key(method, path)
+        last_exc: Exception | None = None
+        for attempt in range(self.max_retries):
+            last_attempt = attempt == self.max_retries - 1
+            bucket = self._bucket(route, major)
+            bucket.acquire()
+            self._global.acquire()
+            try:
+                resp = self.session.request(method, f"{DISCORD_API}{path}", timeout=self.timeout, **kwargs)
+            except requests.RequestException as exc:
+                bucket.release()
+                last_exc = exc
+                if not last_attempt:
+                    time.sleep(2 ** attempt)
+                continue
+            # 之後的嘗試有拿到回應：以這個回應為準，不再拋出先前的網路錯誤
+            last_exc = None
+            self._update_bucket(route, major, resp)
+            if resp.status_code == 429:
+                retry_after = _retry_after(resp)
+                if resp.headers.get("X-RateLimit-Global") or resp.headers.get("X-RateLimit-Scope") == "global":
+                    self._global.pause(retry_after)
+                if not last_attempt:
+                    self.log(f"rate limited on {route}, sleeping {retry_after:.2f}s")
+                    time.sleep(retry_after)
+                continue
+            if resp.status_code >= 500:
+                if not last_attempt:
+                    time.sleep(2 ** attempt)
+                continue
+            return resp
+        if last_exc is not None:
+            raise last_exc
+        return resp
+
+    def get(self, path: str, params: dict | None = None):
+        resp = self.request("GET", path, params=params)
+        resp.raise_for_status()
+        return resp.json()
+
+    def react(self, channel_id: str, message_id: str, emoji: str) -> tuple[bool, str]:
+        """加上 reaction，回傳 (是否成功, 失敗原因)。"""
+        encoded = quote(emoji, safe="")
+        path = f"/channels/{channel_id}/messages/{message_id}/reactions/{encoded}/@me"
+        try:
+            resp = self.request("PUT", path)
+        except requests.RequestException as exc:
+            reason = f"網路錯誤 ({type(exc).__name__})"
+            self.log(f"reaction error for {message_id}: {reason}")
+            return False, reason
+        if resp.status_code in (200, 204):
+            return True, ""
+        if resp.status_code == 429:
+            reason = "rate limited"
+        elif resp.status_code >= 500:
+            reason = f"Discord 伺服器錯誤 (HTTP {resp.status_code})"
+        elif resp.status_code == 403:
+            reason = "權限不足 (HTTP 403)"
+        elif resp.status_code == 404:
+            reason = "訊息已刪除 (HTTP 404)"
+        else:
+            reason = f"HTTP {resp.status_code}"
+        self.log(f"reaction failed for {message_id}: {reason}")
+        return False, reason
+
+    def post_message(self, channel_id: str, content: str) -> bool:
+        try:
+            resp = self.request("POST", f"/channels/{channel_id}/messages", json={"content": content})
+        except requests.RequestException as exc:
+            self.log(f"post message error: {type(exc).__name__}")
+            return False
+        if resp.status_code >= 400:
+            self.log(f"post message failed: HTTP {resp.status_code}")
+            return False
+        return True
+
+    def fetch_messages(self, channel_id: str, after_id: str | None) -> list[dict]:
+        """Return all messages newer than after_id (or whole history if None), oldest first."""
+        path = f"/channels/{channel_id}/messages"
+        collected: list[dict] = []
+        if after_id:
+            cursor = after_id
+            while True:
+                batch = self.get(path, params={"limit": 100, "after": cursor})
+                if not batch:
+                    break
+                # `after` returns newest first; reverse to chronological.
+                batch_sorted = sorted(batch, key=lambda m: int(m["id"]))
+                collected.extend(batch_sorted)
+                cursor = batch_sorted[-1]["id"]
+                if len(batch) < 100:
+                    break
+        else:
+            # First run: walk backwards from newest.
+            before: str | None = None
+            while True:
+                params = {"limit": 100}
+                if before:
+                    params["before"] = before
+                batch = self.get(path, params=params)
+                if not batch:
+                    break
+                collected.extend(batch)
+                before = batch[-1]["id"]
+                if len(batch) < 100:
+                    break
+            collected.sort(key=lambda m: int(m["id"]))
+        return collected
+
+
+def _retry_after(resp: requests.Response) -> float:
+    try:
+        return float(resp.json().get("retry_after", 1))
+    except ValueError:
+        try:
+            return float(resp.headers.get("Retry-After", 1))
+        except (TypeError, ValueError):
+            return 1.0
+
+
+# Discord 訊息長度上限
+_MESSAGE_LIMIT = 2000
+
+
+class ReactionDispatcher:
+    """以少量背景 worker 送出 reaction，速率由 DiscordClient 的 reaction bucket 控制。
+
+    同一則訊息的同一個 emoji 只會送一次；失敗的項目在 close() 後以 post_summary()
+    合併成一則訊息回報，而不是每個失敗各發一則。
+    """
+
+    def __init__(self, client: DiscordClient, channel_id: str, workers: int = 3) -> None:
+        self.client = client
+        self.channel_id = channel_id
+        self.failures: list[tuple[str, str, str]] = []
+        self._seen: set[tuple[str, str]] = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reaction")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def submit(self, message_id: str, emoji: str) -> bool:
+        """排入一個 reaction；已排過相同的 (訊息, emoji) 時回傳 False。"""
+        key = (message_id, emoji)
+        with self._lock:
+            if key in self._seen:
+                return False
+            self._seen.add(key)
+        self._pool.submit(self._send, message_id, emoji)
+        return True
+
+    def _send(self, message_id: str, emoji: str) -> None:
+        try:
+            ok, reason = self.client.react(self.channel_id, message_id, emoji)
+        except Exception as exc:
+            ok, reason = False, type(exc).__name__
+        if not ok:
+            with self._lock:
+                self.failures.append((message_id, emoji, reason))
+
+    def close(self) -> None:
+        """等待所有排入的 reaction 送完。"""
+        self._pool.shutdown(wait=True)
+
+    def post_summary(self) -> bool:
+        """有失敗時在頻道發一則彙整訊息；沒有失敗或發送成功時回傳 True。"""
+        with self._lock:
+            failures = sorted(self.failures)
+        if not failures:
+            return True
+        lines = [f"⚠️ 有 {len(failures)} 個 reaction 無法加上："]
+        for message_id, emoji, reason in failures:
+            line = f"- 訊息 {message_id} {emoji}：{reason}"
+            if sum(len(l) + 1 for l in lines) + len(line) > _MESSAGE_LIMIT - 20:
+                lines.append("- …")
+                break
+            lines.append(line)
+        return self.client.post_message(self.channel_id, "\n".join(lines))
@@ -1,12 +1,20 @@
+import asyncio
 import os
-import re
 import shutil
-import subprocess
+import json
+import logging
+import threading
+import time
 from google import genai
-from tenacity import retry, stop_after_attempt, wait_exponential
+from google.genai import types
 
+from common.claude_cli import ClaudeCliPool
+from common.llm_cache import ResponseCache, cache_from_env, make_cache_key
+from common.llm_metrics import CallMetrics, MetricsHook
+from common.llm_schema import coerce_dataclass, dataclass_json_schema, parse_json_reply
+from common.llm_retry import RetryPolicy, RetryStats, estimate_tokens, is_rate_limited, shared_limiter
 
-_ANSI_RE = re.compile(r"\x1b\[[0-9;]*[mGKHFABCDJKsuhl]|\r")
+log = logging.getLogger(__name__)
 
 
 def is_claude_cli_available() -> bool:
@@ -15,9 +23,34 @@ def is_claude_cli_available() -> bool:
 
 
 class GeminiClient:
-    def __init__(self, model_name: str = "flash", use_cli: bool = False):
+    def __init__(
+        self,
+        model_name: str = "flash",
+        use_cli: bool = False,
+        cache: ResponseCache | None = None,
+        retry_policy: RetryPolicy | None = None,
+        rpm: float | None = None,
+        tpm: float | None = None,
+        cli_pool_size: int = 2,
+        hooks: list[MetricsHook] | None = None,
+    ):
+        """cache 未指定時依環境變數 GEMINI_CACHE 決定（見 common.llm_cache），預設不快取。
+
+        rpm / tpm 未指定時讀 GEMINI_RPM / GEMINI_TPM；同一模型的所有 client 共用同一個限制器。
+        重試次數與等待時間累計在 self.stats。
+        use_cli=True 時以 cli_pool_size 個預熱的 claude 行程輪流處理 prompt（見 common.claude_cli）。
+        hooks 在每次呼叫結束後收到 CallMetrics（見 common.llm_metrics）。
+        """
         self.use_cli = use_cli
         self.model_name = model_name
+        self.cache = cache if cache is not None else cache_from_env(os.getenv("GEMINI_CACHE"))
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.stats = RetryStats()
+        self.hooks: list[MetricsHook] = list(hooks or [])
+        # generate_many 用的背景 event loop；aio client 的連線綁定在建立它的 loop 上，
+        # 所以所有同步呼叫端共用同一個 loop，而不是每次 asyncio.run
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_lock = threading.Lock()
 
         self.model_map = {
             "flash": "gemini-2.5-flash",
@@ -25,6 +58,7 @@ class GeminiClient:
         }
 
         if self.use_cli:
+            self._cli_pool = ClaudeCliPool(size=cli_pool_size)
             return
 
         api_key = os.getenv("GOOGLE_API_KEY")
@@ -32,36 +66,237 @@ class GeminiClient:
             raise ValueError("GOOGLE_API_KEY environment variable not set.")
 
         self.client = genai.Client(api_key=api_key)
+        self.limiter = shared_limiter(
+            self._target_model(),
+            rpm=rpm or _env_float("GEMINI_RPM"),
+            tpm=tpm or _env_float("GEMINI_TPM"),
+        )
 
     def _generate_via_cli(self, prompt: str, timeout: int = 120) -> str:
-        env = os.environ.copy()
-        env["PATH"] = "/opt/homebrew/bin:/usr/local/bin:" + env.get("PATH", "")
-
-        result = subprocess.run(
-            ["claude", "-p", prompt, "--model", "sonnet"],
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-            env=env,
-        )
+        return self._cli_pool.run(prompt, timeout=timeout)
+
+    async def _agenerate_via_cli(self, prompt: str, timeout: int = 120) -> str:
+        return await asyncio.to_thread(self._cli_pool.run, prompt, timeout)
+
+    def _generate_via_api(self, prompt: str, config: dict | None = None, metrics: CallMetrics | None = None) -> str:
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            self.stats.record_throttle(self.limiter.acquire(estimate_tokens(prompt)))
+            try:
+                response = self.client.models.generate_content(
+                    model=self._target_model(),
+                    contents=prompt,
+                    config=types.GenerateContentConfig(**config) if config else None,
+                )
+                self._record_usage(metrics, response)
+                return response.text.strip()
+            except Exception as exc:
+                delay = self._retry_delay(exc, attempt, start)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            attempt += 1
+            if metrics is not None:
+                metrics.retries = attempt
+
+    def add_hook(self, hook: MetricsHook) -> None:
+        self.hooks.append(hook)
+
+    def _emit(self, metrics: CallMetrics) -> None:
+        for hook in self.hooks:
+            try:
+                hook(metrics)
+            except Exception:
+                log.exception("metrics hook failed")
+
+    def _new_metrics(self) -> CallMetrics:
+        return CallMetrics(model=self._target_model(), backend="cli" if self.use_cli else "api")
+
+    @staticmethod
+    def _record_usage(metrics: CallMetrics | None, response) -> None:
+        usage = getattr(response, "usage_metadata", None)
+        if metrics is None or usage is None:
+            return
+        metrics.prompt_tokens = usage.prompt_token_count
+        metrics.response_tokens = usage.candidates_token_count
+
+    async def _agenerate_via_api(self, prompt: str, timeout: int = 120, metrics: CallMetrics | None = None) -> str:
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            waited = await asyncio.to_thread(self.limiter.acquire, estimate_tokens(prompt))
+            self.stats.record_throttle(waited)
+            try:
+                response = await asyncio.wait_for(
+                    self.client.aio.models.generate_content(model=self._target_model(), contents=prompt),
+                    timeout,
+                )
+                self._record_usage(metrics, response)
+                return response.text.strip()
+            except Exception as exc:
+                delay = self._retry_delay(exc, attempt, start)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
+            if metrics is not None:
+                metrics.retries = attempt
+
+    def _retry_delay(self, exc: Exception, attempt: int, start: float) -> float | None:
+        delay = self.retry_policy.delay_for(exc, attempt, time.monotonic() - start)
+        if delay is None:
+            return None
+        if is_rate_limited(exc):
+            self.limiter.pause(delay)
+        self.stats.record_retry(delay)
+        return delay
+
+    def _target_model(self) -> str:
+        if self.use_cli:
+            return "claude-cli:sonnet"
+        return self.model_map.get(self.model_name.lower(), self.model_name)
+
+    def generate(self, prompt: str, timeout: int = 120, use_cache: bool = True) -> str:
+        """use_cache=False 時略過快取（不讀也不寫）。"""
+        return self._generate(prompt, timeout, use_cache)
+
+    def _generate(
+        self, prompt: str, timeout: int, use_cache: bool, config: dict | None = None, store: bool = True
+    ) -> str:
+        """store=False 時只讀快取不寫入，由呼叫端在驗證回覆後自行寫入。"""
+        metrics = self._new_metrics()
+        start = time.monotonic()
+        key = None
+        if self.cache is not None and use_cache:
+            key = make_cache_key(self._target_model(), prompt, config)
+            cached = self.cache.get(key)
+            if cached is not None:
+                metrics.cache_hit = True
+                self._emit(metrics)
+                return cached
 
-        if result.returncode != 0:
-            err = _ANSI_RE.sub("", result.stderr).strip()
-            raise RuntimeError(f"Claude CLI error: {err}")
+        try:
+            if self.use_cli:
+                text = self._generate_via_cli(prompt, timeout=timeout)
+            else:
+                text = self._generate_via_api(prompt, config, metrics)
+        except Exception as exc:
+            metrics.ok = False
+            metrics.error = type(exc).__name__
+            raise
+        finally:
+            metrics.latency = time.monotonic() - start
+            self._emit(metrics)
 
-        return _ANSI_RE.sub("", result.stdout).strip()
+        if key is not None and text and store:
+            self.cache.put(key, text)
+        return text
 
-    @retry(
-        wait=wait_exponential(multiplier=2, min=4, max=60),
-        stop=stop_after_attempt(20)
-    )
-    def _generate_via_api(self, prompt: str) -> str:
-        target_model = self.model_map.get(self.model_name.lower(), self.model_name)
-        response = self.client.models.generate_content(model=target_model, contents=prompt)
-        return response.text.strip()
+    def generate_json(self, prompt: str, schema, timeout: int = 120, use_cache: bool = True):
+        """產生符合 dataclass schema 的 JSON，回傳 schema 的實例。
 
-    def generate(self, prompt: str, timeout: int = 120) -> str:
+        API 模式使用原生 JSON 輸出（response_mime_type + response_json_schema）；CLI 模式
+        把 schema 附在 prompt 後面。回覆無法解析或不符 schema 時，帶著錯誤訊息做一次修正
+        請求，仍失敗則 raise ValueError。只有通過驗證的回覆才寫入快取（以原始 prompt 為 key）。
+        """
+        json_schema = dataclass_json_schema(schema)
+        config = {"response_mime_type": "application/json", "response_json_schema": json_schema}
         if self.use_cli:
-            return self._generate_via_cli(prompt, timeout=timeout)
+            prompt = f"{prompt}\n\n只輸出符合此 JSON Schema 的 JSON：\n{json.dumps(json_schema, ensure_ascii=False)}"
+
+        reply = self._generate(prompt, timeout, use_cache, config, store=False)
+        try:
+            result = coerce_dataclass(schema, parse_json_reply(reply))
+        except ValueError as exc:
+            error = exc
         else:
-            return self._generate_via_api(prompt)
+            self._store(prompt, config, reply, use_cache)
+            return result
+
+        repair_prompt = (
+            "以下 JSON 不符合指定的 JSON Schema，請修正後只輸出修正後的 JSON。\n"
+            f"錯誤：{error}\n"
+            f"JSON Schema：{json.dumps(json_schema, ensure_ascii=False)}\n"
+            f"原始輸出：\n{reply}"
+        )
+        reply = self._generate(repair_prompt, timeout, use_cache, config, store=False)
+        result = coerce_dataclass(schema, parse_json_reply(reply))
+        self._store(prompt, config, reply, use_cache)
+        return result
+
+    def _store(self, prompt: str, config: dict | None, text: str, use_cache: bool) -> None:
+        if self.cache is not None and use_cache and text:
+            self.cache.put(make_cache_key(self._target_model(), prompt, config), text)
+
+    async def agenerate(self, prompt: str, timeout: int = 120, use_cache: bool = True) -> str:
+        """generate 的 async 版本；timeout 套用在每次 API 嘗試 / CLI 呼叫上。"""
+        metrics = self._new_metrics()
+        start = time.monotonic()
+        key = None
+        if self.cache is not None and use_cache:
+            key = make_cache_key(self._target_model(), prompt)
+            cached = self.cache.get(key)
+            if cached is not None:
+                metrics.cache_hit = True
+                self._emit(metrics)
+                return cached
+
+        try:
+            if self.use_cli:
+                text = await self._agenerate_via_cli(prompt, timeout=timeout)
+            else:
+                text = await self._agenerate_via_api(prompt, timeout=timeout, metrics=metrics)
+        except Exception as exc:
+            metrics.ok = False
+            metrics.error = type(exc).__name__
+            raise
+        finally:
+            metrics.latency = time.monotonic() - start
+            self._emit(metrics)
+
+        if key is not None and text:
+            self.cache.put(key, text)
+        return text
+
+    async def agenerate_many(
+        self,
+        prompts: list[str],
+        max_concurrency: int = 4,
+        timeout: int = 120,
+        return_exceptions: bool = False,
+    ) -> list:
+        """以最多 max_concurrency 個並行呼叫產生，結果順序與 prompts 相同。
+
+        return_exceptions=True 時失敗的項目以例外物件放在對應位置，否則第一個錯誤直接 raise。
+        """
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def one(prompt: str) -> str:
+            async with semaphore:
+                return await self.agenerate(prompt, timeout=timeout)
+
+        return await asyncio.gather(*(one(p) for p in prompts), return_exceptions=return_exceptions)
+
+    def generate_many(
+        self,
+        prompts: list[str],
+        max_concurrency: int = 4,
+        timeout: int = 120,
+        return_exceptions: bool = False,
+    ) -> list:
+        """agenerate_many 的同步版本，在 client 專屬的背景 event loop 上執行。"""
+        coro = self.agenerate_many(prompts, max_concurrency, timeout, return_exceptions)
+        return asyncio.run_coroutine_threadsafe(coro, self._background_loop()).result()
+
+    def _background_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="gemini-loop", daemon=True).start()
+            return self._loop
+
+
+def _env_float(name: str) -> float | None:
+    value = os.getenv(name)
+    return float(value) if value else None
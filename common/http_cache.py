@@ -0,0 +1,156 @@
+"""網頁抓取的磁碟快取（SQLite），key 為正規化後的 URL。
+
+保存抽取後的內容（文字或 JSON）與來源的 ETag / Last-Modified：
+  - 抓取後未超過 fresh_for 的項目直接使用，不發送任何請求
+  - 超過 fresh_for 的項目以 If-None-Match / If-Modified-Since 重新驗證，304 時沿用快取
+超過 max_age 的項目刪除；內容總大小超過 max_bytes 時依最近使用時間淘汰（LRU）。
+
+設定環境變數 PAGE_CACHE_PATH 即可啟用（page_cache_from_env）。
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_FRESH_FOR = 24 * 3600
+DEFAULT_MAX_AGE = 90 * 24 * 3600
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+
+# 分享連結常見的追蹤參數，不影響頁面內容
+_TRACKING_PARAMS = {"fbclid", "gclid", "igshid", "igsh", "si", "mc_cid", "mc_eid", "ref_src"}
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    """小寫 scheme / host、去掉預設 port、fragment 與追蹤參數，其餘 query 依序排列。"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = [
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in _TRACKING_PARAMS
+    ]
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(sorted(query)), ""))
+
+
+@dataclass
+class CachedPage:
+    url: str
+    content: str
+    etag: str | None
+    last_modified: str | None
+    fetched_at: float
+
+    def validators(self) -> dict[str, str]:
+        """條件式 GET 要帶的 header；來源沒給 ETag / Last-Modified 時為空。"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class PageCache:
+    def __init__(
+        self,
+        path: Path | str,
+        fresh_for: float = DEFAULT_FRESH_FOR,
+        max_age: float = DEFAULT_MAX_AGE,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        self.fresh_for = fresh_for
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        if str(path) != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def get(self, url: str) -> CachedPage | None:
+        """回傳快取項目（不論是否仍新鮮）；不存在或超過 max_age 時回傳 None。"""
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock, self.conn:
+            row = self.conn.execute(
+                "SELECT content, etag, last_modified, fetched_at FROM pages WHERE url = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[3] > self.max_age:
+                if row is not None:
+                    self.conn.execute("DELETE FROM pages WHERE url = ?", (key,))
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE pages SET accessed_at = ? WHERE url = ?", (now, key))
+        return CachedPage(key, row[0], row[1], row[2], row[3])
+
+    def is_fresh(self, page: CachedPage) -> bool:
+        fresh = time.time() - page.fetched_at < self.fresh_for
+        if fresh:
+            self.hits += 1
+        return fresh
+
+    def put(self, url: str, content: str, etag: str | None = None, last_modified: str | None = None) -> None:
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages "
+                "(url, content, etag, last_modified, size, fetched_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, content, etag, last_modified, len(content.encode("utf-8")), now, now),
+            )
+            self.conn.execute("DELETE FROM pages WHERE fetched_at < ?", (now - self.max_age,))
+            self.conn.execute(
+                "DELETE FROM pages WHERE url IN ("
+                "SELECT url FROM (SELECT url, SUM(size) OVER (ORDER BY accessed_at DESC, url) AS total "
+                "FROM pages) WHERE total > ?)",
+                (self.max_bytes,),
+            )
+
+    def mark_revalidated(self, url: str) -> None:
+        """來源回 304：內容沒變，重設抓取時間。"""
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE url = ?",
+                (now, now, normalize_url(url)),
+            )
+        self.revalidated += 1
+
+    def summary(self) -> str:
+        return (f"Page cache: {self.hits} fresh hit(s), {self.revalidated} revalidated (304), "
+                f"{self.misses} miss(es)")
+
+
+def page_cache_from_env(fresh_for: float = DEFAULT_FRESH_FOR) -> PageCache | None:
+    """PAGE_CACHE_PATH 有設定時建立 PageCache，否則回傳 None（不快取）。"""
+    path = os.environ.get("PAGE_CACHE_PATH")
+    if not path:
+        return None
+    return PageCache(os.path.expanduser(path), fresh_for=fresh_for)
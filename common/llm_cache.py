@@ -0,0 +1,79 @@
+"""GeminiClient 的回應快取。
+
+key 為 (模型, prompt hash, generation 參數) 的 hash。提供兩種 backend：
+  - MemoryCache: 行程內 LRU
+  - SqliteCache: 磁碟 SQLite，跨執行共用，支援 TTL 與筆數上限（common.sqlite_store）
+
+不改呼叫端程式即可啟用：設定環境變數 GEMINI_CACHE 為
+  memory                 行程內 LRU
+  sqlite                 預設路徑 ~/.cache/tools/gemini_cache.db
+  sqlite:/path/to/db     指定路徑
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Protocol
+
+from common.sqlite_store import SqliteLruStore
+
+DEFAULT_SQLITE_PATH = Path.home() / ".cache" / "tools" / "gemini_cache.db"
+DEFAULT_MAX_ENTRIES = 2000
+DEFAULT_TTL = 30 * 24 * 3600
+
+
+class ResponseCache(Protocol):
+    def get(self, key: str) -> str | None: ...
+    def put(self, key: str, value: str) -> None: ...
+
+
+def make_cache_key(model: str, prompt: str, params: dict | None = None) -> str:
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    raw = json.dumps({"model": model, "prompt": prompt_hash, "params": params or {}}, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class MemoryCache:
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        self.max_entries = max_entries
+        self._items: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: str) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+
+class SqliteCache(SqliteLruStore):
+    def __init__(
+        self,
+        path: Path | str = DEFAULT_SQLITE_PATH,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl: float = DEFAULT_TTL,
+    ) -> None:
+        super().__init__(path, "responses", max_entries, ttl)
+
+
+def cache_from_env(value: str | None) -> ResponseCache | None:
+    """解析 GEMINI_CACHE 設定；未設定或無法辨識時回傳 None（不快取）。"""
+    if not value:
+        return None
+    kind, _, path = value.partition(":")
+    kind = kind.strip().lower()
+    if kind == "memory":
+        return MemoryCache()
+    if kind == "sqlite":
+        return SqliteCache(path or DEFAULT_SQLITE_PATH)
+    return None
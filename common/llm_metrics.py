@@ -0,0 +1,90 @@
+"""LLM 呼叫的量測：GeminiClient 每次呼叫結束都把 CallMetrics 傳給註冊的 hook。
+
+MetricsAggregator 本身就是一個 hook，收集整個 job 的呼叫後可印出摘要表，
+並可附加寫入 JSON Lines 方便追蹤趨勢。環境變數 LLM_METRICS_PATH 有設定時，
+report() 會自動寫入該檔案。
+"""
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from typing import Callable
+
+
+@dataclass
+class CallMetrics:
+    model: str
+    backend: str  # "api" or "cli"
+    latency: float = 0.0
+    prompt_tokens: int | None = None
+    response_tokens: int | None = None
+    retries: int = 0
+    cache_hit: bool = False
+    ok: bool = True
+    error: str | None = None
+    timestamp: float = field(default_factory=time.time)
+
+
+MetricsHook = Callable[[CallMetrics], None]
+
+
+class MetricsAggregator:
+    def __init__(self) -> None:
+        self.calls: list[CallMetrics] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, metrics: CallMetrics) -> None:
+        with self._lock:
+            self.calls.append(metrics)
+
+    def summary_table(self) -> str:
+        with self._lock:
+            calls = list(self.calls)
+        if not calls:
+            return "LLM calls: none"
+
+        by_model: dict[str, list[CallMetrics]] = defaultdict(list)
+        for call in calls:
+            by_model[call.model].append(call)
+
+        header = ("model", "calls", "cached", "errors", "retries", "in_tok", "out_tok", "total_s", "avg_s")
+        rows = [header]
+        for model, items in sorted(by_model.items()):
+            live = [c for c in items if not c.cache_hit]
+            total = sum(c.latency for c in live)
+            rows.append((
+                model,
+                str(len(items)),
+                str(len(items) - len(live)),
+                str(sum(not c.ok for c in items)),
+                str(sum(c.retries for c in items)),
+                str(sum(c.prompt_tokens or 0 for c in items)),
+                str(sum(c.response_tokens or 0 for c in items)),
+                f"{total:.1f}",
+                f"{total / len(live):.2f}" if live else "-",
+            ))
+        widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+        lines = ["  ".join(cell.ljust(w) if i == 0 else cell.rjust(w) for i, (cell, w) in enumerate(zip(row, widths)))
+                 for row in rows]
+        lines.insert(1, "-" * len(lines[0]))
+        return "\n".join(lines)
+
+    def dump_jsonl(self, path: str, job: str | None = None) -> None:
+        with self._lock:
+            calls = list(self.calls)
+        with open(path, "a", encoding="utf-8") as f:
+            for call in calls:
+                record = asdict(call)
+                if job:
+                    record["job"] = job
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def report(self, job: str, out: Callable[[str], None] = print) -> None:
+        """輸出摘要表；有設定 LLM_METRICS_PATH 時一併附加寫入 JSON Lines。"""
+        out(f"LLM usage ({job}):\n{self.summary_table()}")
+        path = os.environ.get("LLM_METRICS_PATH")
+        if path:
+            self.dump_jsonl(path, job=job)
@@ -0,0 +1,156 @@
+"""LLM API 呼叫的重試策略與共用的用戶端速率限制。
+
+RetryPolicy 依錯誤類型決定是否重試：
+  - 429：優先使用伺服器提供的 retryDelay / Retry-After，並讓同模型的所有呼叫一起暫停
+  - 408 / 5xx、逾時與連線錯誤：指數退避（含 jitter）
+  - 其他 4xx（prompt 錯誤、認證失敗…）與未知例外：立即失敗
+並以 deadline 限制單次呼叫含重試的總時間。
+
+RateLimiter 以 token bucket 實作 RPM / TPM 上限，同一模型的所有 GeminiClient 共用一個。
+"""
+
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+
+from google.genai import errors
+
+from common.ratelimit import TokenBucket
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+_DURATION_RE = re.compile(r"^\s*([\d.]+)\s*s\s*$")
+
+
+@dataclass
+class RetryStats:
+    """累計的重試次數與等待時間（秒），可跨執行緒更新。"""
+    retries: int = 0
+    retry_wait: float = 0.0
+    throttle_wait: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record_retry(self, delay: float) -> None:
+        with self._lock:
+            self.retries += 1
+            self.retry_wait += delay
+
+    def record_throttle(self, waited: float) -> None:
+        if waited <= 0:
+            return
+        with self._lock:
+            self.throttle_wait += waited
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    return isinstance(exc, errors.APIError) and exc.code == 429
+
+
+def server_retry_delay(exc: BaseException) -> float | None:
+    """從 429 回應取出伺服器建議的等待秒數（google.rpc.RetryInfo 或 Retry-After）。"""
+    if not isinstance(exc, errors.APIError):
+        return None
+    details = exc.details if isinstance(exc.details, dict) else {}
+    for item in (details.get("error") or details).get("details") or []:
+        if isinstance(item, dict) and "retryDelay" in item:
+            m = _DURATION_RE.match(str(item["retryDelay"]))
+            if m:
+                return float(m.group(1))
+    headers = getattr(exc.response, "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_transient(exc: BaseException) -> bool:
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    try:
+        import httpx
+    except ImportError:
+        return False
+    return isinstance(exc, httpx.TransportError)
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        max_attempts: int = 8,
+        base_delay: float = 2.0,
+        max_delay: float = 60.0,
+        deadline: float = 300.0,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def delay_for(self, exc: BaseException, attempt: int, elapsed: float) -> float | None:
+        """第 attempt 次（從 0 起算）失敗後要等待的秒數；None 表示不再重試。"""
+        if attempt + 1 >= self.max_attempts:
+            return None
+        if isinstance(exc, errors.APIError):
+            if exc.code not in RETRYABLE_STATUS:
+                return None
+        elif not _is_transient(exc):
+            return None
+
+        delay = server_retry_delay(exc) if is_rate_limited(exc) else None
+        if delay is None:
+            delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+        if elapsed + delay > self.deadline:
+            return None
+        return delay
+
+
+class RateLimiter:
+    """RPM / TPM 限制；rpm、tpm 為 None 時不限制，但仍支援 429 時的全域暫停。"""
+
+    def __init__(self, rpm: float | None = None, tpm: float | None = None):
+        self._requests = TokenBucket(rpm / 60, capacity=rpm) if rpm else None
+        self._tokens = TokenBucket(tpm / 60, capacity=tpm) if tpm else None
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> float:
+        """等待配額，回傳等待秒數。"""
+        waited = 0.0
+        with self._lock:
+            pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+            waited += pause
+        if self._requests is not None:
+            waited += self._requests.acquire()
+        if self._tokens is not None:
+            waited += self._tokens.acquire(min(tokens, self._tokens.capacity))
+        return waited
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+_limiters: dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def shared_limiter(model: str, rpm: float | None = None, tpm: float | None = None) -> RateLimiter:
+    """回傳該模型在本行程內共用的 RateLimiter（第一次建立時的 rpm / tpm 為準）。"""
+    with _limiters_lock:
+        if model not in _limiters:
+            _limiters[model] = RateLimiter(rpm, tpm)
+        return _limiters[model]
+
+
+# 漢字與假名
+_CJK_RE = re.compile(r"[㐀-䶿一-鿿぀-ヿ]")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗估 token 數：漢字/假名約一字一 token，其餘約四字元一 token。"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk) // 4 + 1
@@ -0,0 +1,113 @@
+"""dataclass ↔ JSON Schema 轉換，供 GeminiClient.generate_json 使用。
+
+支援的欄位型別：str / int / float / bool、X | None、list[X]，以及巢狀 dataclass。
+沒有預設值的欄位視為必填。
+"""
+
+import dataclasses
+import json
+import re
+import types
+import typing
+from typing import Any
+
+_PRIMITIVES = {str: "string", int: "integer", float: "number", bool: "boolean"}
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def _split_optional(tp) -> tuple[Any, bool]:
+    if typing.get_origin(tp) in (typing.Union, types.UnionType):
+        args = [a for a in typing.get_args(tp) if a is not type(None)]
+        if len(args) == 1 and len(typing.get_args(tp)) == 2:
+            return args[0], True
+    return tp, False
+
+
+def _type_schema(tp) -> dict:
+    tp, nullable = _split_optional(tp)
+    if tp in _PRIMITIVES:
+        schema = {"type": _PRIMITIVES[tp]}
+    elif typing.get_origin(tp) is list:
+        (item,) = typing.get_args(tp)
+        schema = {"type": "array", "items": _type_schema(item)}
+    elif dataclasses.is_dataclass(tp):
+        schema = dataclass_json_schema(tp)
+    else:
+        raise TypeError(f"unsupported field type: {tp!r}")
+    if nullable:
+        return {"anyOf": [schema, {"type": "null"}]}
+    return schema
+
+
+def _required(field: dataclasses.Field) -> bool:
+    return field.default is dataclasses.MISSING and field.default_factory is dataclasses.MISSING
+
+
+def dataclass_json_schema(cls) -> dict:
+    hints = typing.get_type_hints(cls)
+    fields = [f for f in dataclasses.fields(cls) if f.init]
+    return {
+        "type": "object",
+        "properties": {f.name: _type_schema(hints[f.name]) for f in fields},
+        "required": [f.name for f in fields if _required(f)],
+    }
+
+
+def _coerce(tp, value, path: str):
+    tp, nullable = _split_optional(tp)
+    if value is None:
+        if nullable:
+            return None
+        raise ValueError(f"{path}: null is not allowed")
+    if tp is str:
+        if isinstance(value, (dict, list)):
+            raise ValueError(f"{path}: expected string")
+        return str(value)
+    if tp in (int, float):
+        if isinstance(value, bool):
+            raise ValueError(f"{path}: expected number")
+        try:
+            return tp(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{path}: expected number, got {value!r}") from None
+    if tp is bool:
+        if not isinstance(value, bool):
+            raise ValueError(f"{path}: expected boolean")
+        return value
+    if typing.get_origin(tp) is list:
+        if not isinstance(value, list):
+            raise ValueError(f"{path}: expected array")
+        (item,) = typing.get_args(tp)
+        return [_coerce(item, v, f"{path}[{i}]") for i, v in enumerate(value)]
+    if dataclasses.is_dataclass(tp):
+        return coerce_dataclass(tp, value, path)
+    raise TypeError(f"unsupported field type: {tp!r}")
+
+
+def coerce_dataclass(cls, data, path: str = "$"):
+    """依 dataclass 欄位型別驗證並轉換 dict；缺少必填欄位或型別不符時 raise ValueError。"""
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: expected object")
+    hints = typing.get_type_hints(cls)
+    kwargs = {}
+    for f in dataclasses.fields(cls):
+        if not f.init:
+            continue
+        if f.name not in data:
+            if _required(f):
+                raise ValueError(f"{path}.{f.name}: missing required field")
+            continue
+        kwargs[f.name] = _coerce(hints[f.name], data[f.name], f"{path}.{f.name}")
+    return cls(**kwargs)
+
+
+def parse_json_reply(text: str):
+    """解析模型回覆的 JSON；容忍 markdown code fence 與前後多餘文字。"""
+    text = _FENCE_RE.sub("", text.strip())
+    try:
+        return json.loads(text)
+    except ValueError:
+        start, end = text.find("{"), text.rfind("}")
+        if start == -1 or end <= start:
+            raise
+        return json.loads(text[start:end + 1])
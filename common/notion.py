@@ -1,49 +1,201 @@
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from common.ratelimit import TokenBucket
+
+NOTION_API = "https://api.notion.com/v1"
+
+# Notion 官方限制：每個 integration 平均 3 requests/sec
+NOTION_RATE_LIMIT = 3.0
+
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+@dataclass
+class BulkResult:
+    """bulk_create_pages 單筆結果；response 與 error 至少有一個不為 None。"""
+    properties: dict
+    response: requests.Response | None = None
+    error: Exception | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.response is not None and self.response.status_code in (200, 201)
+
 
 # https://developers.notion.com/reference/intro
 class NotionApi:
-    def __init__(self, token):
+    """Notion REST client。
+
+    所有呼叫共用同一個 requests.Session（keep-alive 連線池），避免每次呼叫都重做
+    TCP + TLS handshake。可當 context manager 使用，離開時關閉連線池。
+    """
+
+    def __init__(
+        self,
+        token,
+        pool_size: int = 10,
+        timeout: float = 30,
+        base_url: str = NOTION_API,
+        rate_limit: float = NOTION_RATE_LIMIT,
+    ):
         self.token = token
+        self.timeout = timeout
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self._bucket = TokenBucket(rate_limit)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(self.__header())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self) -> None:
+        self.session.close()
 
     def query_database(self, database_id: str, body: dict):
-        return requests.post(
-            f"https://api.notion.com/v1/databases/{database_id}/query",
+        return self.session.post(
+            f"{self.base_url}/databases/{database_id}/query",
             data = json.dumps(body),
-            headers = self.__header()
+            timeout = self.timeout
         )
 
-    def patch_page(self, page_id: str, properties: dict):
-        return requests.patch(
-            f"https://api.notion.com/v1/pages/{page_id}",
-            data = json.dumps(properties),
-            headers = self.__header()
+    def iter_query(
+        self,
+        database_id: str,
+        filter: dict | None = None,
+        page_size: int = 100,
+        sorts: list | None = None,
+        prefetch: bool = False,
+    ):
+        """逐頁查詢資料庫並逐筆 yield 結果，自動處理 start_cursor / has_more。
+
+        prefetch=True 時在背景執行緒先抓下一頁，讓呼叫端處理本頁時同時等網路。
+        任一頁查詢失敗會 raise requests.HTTPError。
+        """
+        body: dict = {"page_size": page_size}
+        if filter:
+            body["filter"] = filter
+        if sorts:
+            body["sorts"] = sorts
+
+        def fetch(cursor: str | None) -> dict:
+            page_body = dict(body)
+            if cursor:
+                page_body["start_cursor"] = cursor
+            resp = self.query_database(database_id, page_body)
+            resp.raise_for_status()
+            return resp.json()
+
+        if not prefetch:
+            cursor = None
+            while True:
+                data = fetch(cursor)
+                yield from data["results"]
+                if not data.get("has_more"):
+                    return
+                cursor = data.get("next_cursor")
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pending = pool.submit(fetch, None)
+            while pending is not None:
+                data = pending.result()
+                pending = None
+                if data.get("has_more"):
+                    pending = pool.submit(fetch, data.get("next_cursor"))
+                yield from data["results"]
+
+    def patch_page(self, page_id: str, properties: dict, max_retries: int = 5):
+        """經過速率限制送出；429 / 5xx 重試方式同 bulk_create_pages。"""
+        return self._send_with_retry(
+            "PATCH", f"{self.base_url}/pages/{page_id}", json.dumps({ "properties": properties }), max_retries
         )
 
-    def create_page(self, database_id: str, properties: dict):
+    def create_page(self, database_id: str, properties: dict, max_retries: int = 5):
+        """經過速率限制送出；429 / 5xx 重試方式同 bulk_create_pages。"""
         body = {
             "parent": { "database_id": database_id },
             "properties": properties
         }
 
-        return requests.post(
-            "https://api.notion.com/v1/pages",
-            data = json.dumps(body),
-            headers = self.__header()
-        )
+        return self._send_with_retry("POST", f"{self.base_url}/pages", json.dumps(body), max_retries)
+
+    def bulk_create_pages(
+        self,
+        database_id: str,
+        properties_list,
+        max_workers: int = 3,
+        max_retries: int = 5,
+    ) -> list[BulkResult]:
+        """並行建立多個頁面，回傳結果順序與輸入相同。
+
+        以 worker pool 送出，所有 worker 共用 token bucket 遵守 Notion 速率限制；
+        429 / 5xx 依 Retry-After（或指數退避）重試。單筆失敗不影響其他筆。
+        """
+        items = list(properties_list)
+        workers = max(1, min(max_workers, self.pool_size, len(items) or 1))
+
+        def create(properties: dict) -> BulkResult:
+            body = {
+                "parent": { "database_id": database_id },
+                "properties": properties
+            }
+            try:
+                resp = self._send_with_retry(
+                    "POST", f"{self.base_url}/pages", json.dumps(body), max_retries
+                )
+                return BulkResult(properties, response=resp)
+            except requests.RequestException as e:
+                return BulkResult(properties, error=e)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(create, items))
+
+    def _send_with_retry(self, method: str, url: str, data: str | None, max_retries: int) -> requests.Response:
+        """經過速率限制送出請求，遇到 429 / 5xx / 連線錯誤時重試。"""
+        for attempt in range(max_retries + 1):
+            self._bucket.acquire()
+            try:
+                resp = self.session.request(method, url, data=data, timeout=self.timeout)
+            except requests.RequestException:
+                if attempt == max_retries:
+                    raise
+                time.sleep(2 ** attempt)
+                continue
+
+            if resp.status_code not in _RETRY_STATUS or attempt == max_retries:
+                return resp
+
+            delay = _retry_after(resp, default=2 ** attempt)
+            if resp.status_code == 429:
+                self._bucket.pause(delay)
+            time.sleep(delay)
+        raise AssertionError("unreachable")
 
     def get_page(self, page_id: str):
         """獲取頁面屬性和基本資訊"""
-        return requests.get(
-            f"https://api.notion.com/v1/pages/{page_id}",
-            headers=self.__header()
+        return self.session.get(
+            f"{self.base_url}/pages/{page_id}",
+            timeout=self.timeout
         )
 
     def get_block_children(self, block_id: str):
         """獲取區塊的子內容"""
-        return requests.get(
-            f"https://api.notion.com/v1/blocks/{block_id}/children",
-            headers=self.__header()
+        return self.session.get(
+            f"{self.base_url}/blocks/{block_id}/children",
+            timeout=self.timeout
         )
 
     def get_page_content(self, page_id: str):
@@ -64,9 +216,9 @@ class NotionApi:
 
     def get_database(self, database_id: str):
         """獲取資料庫屬性結構"""
-        return requests.get(
-            f"https://api.notion.com/v1/databases/{database_id}",
-            headers=self.__header()
+        return self.session.get(
+            f"{self.base_url}/databases/{database_id}",
+            timeout=self.timeout
         )
 
     def get_property_names_by_type(self, database_id: str, property_types: list):
@@ -91,30 +243,26 @@ class NotionApi:
             "children": children
         }
 
-        return requests.patch(
-            f"https://api.notion.com/v1/blocks/{block_id}/children",
+        return self.session.patch(
+            f"{self.base_url}/blocks/{block_id}/children",
             data=json.dumps(body),
-            headers=self.__header()
+            timeout=self.timeout
         )
 
     def check_record_exists(self, database_id: str, title_property: str, title_value: str):
         """檢查資料庫中是否已存在指定標題的記錄"""
         filter_body = {
-            "filter": {
-                "property": title_property,
-                "title": {
-                    "equals": title_value
-                }
+            "property": title_property,
+            "title": {
+                "equals": title_value
             }
         }
 
-        response = self.query_database(database_id, filter_body)
-        if response.status_code == 200:
-            results = response.json()["results"]
-            return len(results) > 0
-        else:
-            print(f"檢查記錄存在失敗: {response.status_code}")
-            print(response.text)
+        try:
+            return next(self.iter_query(database_id, filter_body, page_size=1), None) is not None
+        except requests.HTTPError as e:
+            print(f"檢查記錄存在失敗: {e.response.status_code}")
+            print(e.response.text)
             return False
 
     def __header(self) -> dict:
@@ -123,3 +271,10 @@ class NotionApi:
             "Notion-Version": "2022-06-28",
             "Authorization": f"Bearer {self.token}"
         }
+
+
+def _retry_after(resp: requests.Response, default: float) -> float:
+    try:
+        return float(resp.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return default
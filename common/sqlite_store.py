@@ -0,0 +1,76 @@
+"""跨執行共用的 SQLite key-value 儲存，支援 TTL 與筆數上限（LRU 淘汰）。
+
+GeminiClient 的回應快取（common.llm_cache）與 threads_monitor 的翻譯快取共用這一份實作；
+呼叫端自行決定 key 的算法。超過 TTL 的項目視為未命中並刪除；
+筆數超過 max_entries 時依最近使用時間淘汰。
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+class SqliteLruStore:
+    def __init__(
+        self,
+        path: Path | str,
+        table: str,
+        max_entries: int,
+        ttl: float,
+        value_column: str = "value",
+    ) -> None:
+        """table / value_column 讓既有的快取檔沿用原本的資料表。"""
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._table = table
+        self._value = value_column
+        if str(path) != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                key TEXT PRIMARY KEY,
+                {value_column} TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock, self.conn:
+            row = self.conn.execute(
+                f"SELECT {self._value}, created_at FROM {self._table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self.conn.execute(f"DELETE FROM {self._table} WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self.conn.execute(f"UPDATE {self._table} SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {self._table} (key, {self._value}, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self.conn.execute(
+                f"DELETE FROM {self._table} WHERE key NOT IN "
+                f"(SELECT key FROM {self._table} ORDER BY accessed_at DESC LIMIT ?)",
+                (self.max_entries,),
+            )
@@ -5,12 +5,23 @@ processed message id, so each message is handled at most once and only new
 messages are fetched on subsequent runs.
 
 For every new message: extract restaurant info via Gemini (+ page scraping),
-write it to Notion, and react ✅ (full) / 🔖 (partial) / ❌ (error).
+write it to Notion, and react ✅ (full) / 🔖 (partial) / ❌ (error). Restaurants
+already in the database (same link, or same name + town) are not added again:
+missing fields are merged into the existing row and the message gets 🔁. Messages
+flow through a staged pipeline (fetch → LLM → Notion → Discord) so a backlog is
+processed concurrently; last_message_id only advances past messages that went
+through every stage. Each finished message is also appended to
+eat_later/progress.jsonl as it completes, so a run that gets killed midway
+resumes without redoing work (see progress.py).
 
 Required env vars:
     DISCORD_BOT_TOKEN
     NOTION_SECRET
     GOOGLE_API_KEY        used by common.gemini for the extraction step
+
+Optional env vars:
+    LLM_METRICS_PATH      append per-call LLM metrics as JSON Lines (see common.llm_metrics)
+    PAGE_CACHE_PATH       SQLite cache for fetched restaurant pages (see common.http_cache)
 """
 
 from __future__ import annotations
@@ -19,20 +30,23 @@ import json
 import logging
 import os
 import sys
-import time
+from dataclasses import dataclass, field
 from pathlib import Path
-from urllib.parse import quote
-
-import requests
 
 _here = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, os.path.join(_here, ".."))
 sys.path.insert(0, _here)
 
+from common.discord import DiscordClient, ReactionDispatcher
 from common.gemini import GeminiClient
+from common.llm_metrics import MetricsAggregator
 from common.notion import NotionApi
-from extractor import extract
-from notion_writer import write
+import extractor
+from extractor import ExtractResult, PageInfo, extract_batch, extract_urls, gather_pages
+from notion_writer import DB_ID, write
+from pipeline import Pipeline, Stage, Watermark
+from progress import ProgressJournal, write_atomic
+from restaurant_index import RestaurantIndex
 
 logging.basicConfig(
     level=logging.INFO,
@@ -42,13 +56,22 @@ log = logging.getLogger(__name__)
 
 BASE_DIR = Path(__file__).resolve().parent
 STATE_PATH = BASE_DIR / "state.json"
+PROGRESS_PATH = BASE_DIR / "progress.jsonl"
 
-DISCORD_API = "https://discord.com/api/v10"
 CHANNEL_ID = "1498113717286600847"
 
 REACTION_OK = "✅"
 REACTION_PARTIAL = "🔖"
 REACTION_ERROR = "❌"
+REACTION_DUPLICATE = "🔁"
+
+# 各階段的 worker 數；LLM 與 Notion 的呼叫另經各自的速率限制與 429 重試
+FETCH_WORKERS = 6
+LLM_WORKERS = 2
+# 補抓積壓訊息時，LLM 階段一次把最多這麼多則訊息合併成一個 prompt
+LLM_BATCH_SIZE = 8
+NOTION_WORKERS = 3
+REACTION_WORKERS = 3
 
 
 def load_state() -> dict:
@@ -59,97 +82,89 @@ def load_state() -> dict:
 
 
 def save_state(state: dict) -> None:
-    with STATE_PATH.open("w", encoding="utf-8") as f:
-        json.dump(state, f, ensure_ascii=False, indent=2, sort_keys=True)
-        f.write("\n")
-
-
-def discord_get(path: str, token: str, params: dict | None = None) -> list:
-    headers = {"Authorization": f"Bot {token}", "User-Agent": "eat-later-bot/1.0"}
-    for attempt in range(5):
-        resp = requests.get(f"{DISCORD_API}{path}", headers=headers, params=params, timeout=30)
-        if resp.status_code == 429:
-            retry_after = float(resp.json().get("retry_after", 1))
-            log.info("rate limited, sleeping %ss", retry_after)
-            time.sleep(retry_after)
-            continue
-        if resp.status_code >= 500:
-            time.sleep(2 ** attempt)
-            continue
-        resp.raise_for_status()
-        return resp.json()
-    raise RuntimeError(f"Discord API failed for {path}")
-
-
-def discord_react(token: str, channel_id: str, message_id: str, emoji: str) -> bool:
-    headers = {"Authorization": f"Bot {token}", "User-Agent": "eat-later-bot/1.0"}
-    encoded = quote(emoji, safe="")
-    url = f"{DISCORD_API}/channels/{channel_id}/messages/{message_id}/reactions/{encoded}/@me"
-    for attempt in range(3):
-        try:
-            resp = requests.put(url, headers=headers, timeout=30)
-        except requests.RequestException as e:
-            log.warning("reaction error for %s: %s", message_id, type(e).__name__)
-            time.sleep(2 ** attempt)
-            continue
-        if resp.status_code in (200, 204):
-            return True
-        if resp.status_code == 429:
-            retry_after = float(resp.json().get("retry_after", 1))
-            log.info("reaction rate limited, sleeping %ss", retry_after)
-            time.sleep(retry_after)
-            continue
-        if resp.status_code >= 500:
-            time.sleep(2 ** attempt)
-            continue
-        log.warning("reaction failed for %s: HTTP %s", message_id, resp.status_code)
-        return False
-    log.warning("reaction gave up for %s", message_id)
-    return False
-
-
-def fetch_messages(token: str, channel_id: str, after_id: str | None) -> list[dict]:
-    """Return all messages newer than after_id (or whole history if None), oldest first."""
-    collected: list[dict] = []
-    if after_id:
-        cursor = after_id
-        while True:
-            batch = discord_get(
-                f"/channels/{channel_id}/messages",
-                token,
-                params={"limit": 100, "after": cursor},
-            )
-            if not batch:
-                break
-            # `after` returns newest first; reverse to chronological.
-            batch_sorted = sorted(batch, key=lambda m: int(m["id"]))
-            collected.extend(batch_sorted)
-            cursor = batch_sorted[-1]["id"]
-            if len(batch) < 100:
-                break
-    else:
-        # First run: walk backwards from newest.
-        cursor = None
-        all_msgs: list[dict] = []
-        while True:
-            params = {"limit": 100}
-            if cursor:
-                params["before"] = cursor
-            batch = discord_get(f"/channels/{channel_id}/messages", token, params=params)
-            if not batch:
-                break
-            all_msgs.extend(batch)
-            cursor = batch[-1]["id"]
-            if len(batch) < 100:
-                break
-        collected = sorted(all_msgs, key=lambda m: int(m["id"]))
-    return collected
+    write_atomic(STATE_PATH, json.dumps(state, ensure_ascii=False, indent=2, sort_keys=True) + "\n")
 
 
 def is_bot_message(msg: dict) -> bool:
     return bool((msg.get("author") or {}).get("bot"))
 
 
+@dataclass
+class Job:
+    msg_id: str
+    content: str
+    pages: list[PageInfo] = field(default_factory=list)
+    result: ExtractResult | None = None
+    error: str | None = None
+    # "created" / "merged" / "skipped"（已存在且沒有可補的欄位）/ "duplicate"（連結已存在，未送 LLM）
+    outcome: str | None = None
+
+
+def build_stages(
+    reactions: ReactionDispatcher,
+    gemini: GeminiClient,
+    notion: NotionApi,
+    index: RestaurantIndex | None = None,
+) -> list[Stage]:
+    """fetch → LLM → Notion → Discord。前面階段失敗時 job.error 有值，後面只剩 ❌ reaction。
+
+    Discord 階段只把 reaction 排入 ReactionDispatcher，實際送出由它的 worker 依速率限制處理。
+
+    有 index 時，連結已在資料庫中的訊息在 fetch 階段就標為 duplicate，不再抓網頁與呼叫 LLM。
+    """
+
+    def fetch(job: Job) -> Job:
+        if index is not None and index.find_url(extract_urls(job.content)):
+            job.outcome = "duplicate"
+            return job
+        job.pages = gather_pages(job.content)
+        return job
+
+    def llm(jobs: list[Job]) -> list[Job]:
+        todo = [job for job in jobs if job.outcome is None]
+        if not todo:
+            return jobs
+        try:
+            results = extract_batch([(job.msg_id, job.content, job.pages) for job in todo], gemini)
+        except Exception as exc:
+            log.exception("extract failed for %d message(s)", len(todo))
+            results = {}
+            for job in todo:
+                job.error = str(exc)
+        for job in todo:
+            job.result = results.get(job.msg_id)
+        return jobs
+
+    def save(job: Job) -> Job:
+        if job.error is None and job.outcome is None:
+            try:
+                job.outcome = write(job.result, notion, index)
+            except Exception as exc:
+                log.exception("notion write failed for message %s", job.msg_id)
+                job.error = str(exc)
+        return job
+
+    def react(job: Job) -> Job:
+        if job.error is not None:
+            reactions.submit(job.msg_id, REACTION_ERROR)
+            return job
+        if job.outcome != "created":
+            reactions.submit(job.msg_id, REACTION_DUPLICATE)
+            log.info("message %s is a duplicate (%s)", job.msg_id, job.outcome)
+            return job
+        reaction = REACTION_OK if job.result.confidence == "full" else REACTION_PARTIAL
+        reactions.submit(job.msg_id, reaction)
+        log.info("saved %r (confidence=%s)", job.result.name, job.result.confidence)
+        return job
+
+    return [
+        Stage("fetch", fetch, FETCH_WORKERS),
+        Stage("llm", llm, LLM_WORKERS, batch_size=LLM_BATCH_SIZE),
+        Stage("notion", save, NOTION_WORKERS),
+        Stage("discord", react),
+    ]
+
+
 def main() -> int:
     token = os.environ.get("DISCORD_BOT_TOKEN")
     notion_secret = os.environ.get("NOTION_SECRET")
@@ -158,41 +173,68 @@ def main() -> int:
         return 1
     channel_id = CHANNEL_ID
 
-    gemini = GeminiClient(model_name="flash")  # raises ValueError if GOOGLE_API_KEY missing
+    discord = DiscordClient(token, user_agent="eat-later-bot/1.0", log=log.info)
+    llm_metrics = MetricsAggregator()
+    gemini = GeminiClient(model_name="flash", hooks=[llm_metrics])  # raises ValueError if GOOGLE_API_KEY missing
     notion = NotionApi(notion_secret)
+    # 每個 fetch worker 同時抓最多 MAX_PAGES 個網頁，共用同一個連線池
+    extractor.configure_session(FETCH_WORKERS * extractor.MAX_PAGES)
 
     state = load_state()
     last_id = state.get("last_message_id")
 
     log.info("Fetching messages (after=%s)", last_id)
-    messages = fetch_messages(token, channel_id, last_id)
+    messages = discord.fetch_messages(channel_id, last_id)
     log.info("Got %d new messages", len(messages))
 
-    highest_id = last_id
+    journal = ProgressJournal(PROGRESS_PATH)
+    finished = journal.load()
+    if finished:
+        log.info("resuming: %d message(s) already finished in a previous run", len(finished))
+
+    watermark = Watermark([msg["id"] for msg in messages], start=last_id)
+    jobs: list[Job] = []
     for msg in messages:
-        msg_id = msg["id"]
-        if highest_id is None or int(msg_id) > int(highest_id):
-            highest_id = msg_id
-        if is_bot_message(msg):
-            continue
         content = (msg.get("content") or "").strip()
-        if not content:
+        if is_bot_message(msg) or not content or msg["id"] in finished:
+            watermark.done(msg["id"])
             continue
+        jobs.append(Job(msg["id"], content))
 
-        log.info("processing message %s", msg_id)
+    def on_done(job: Job) -> None:
+        journal.record(job.msg_id, job.outcome if job.error is None else "error")
+        watermark.done(job.msg_id)
+
+    index = None
+    if jobs:
         try:
-            result = extract(content, gemini)
-            write(result, notion)
-            reaction = REACTION_OK if result.confidence == "full" else REACTION_PARTIAL
-            discord_react(token, channel_id, msg_id, reaction)
-            log.info("saved %r (confidence=%s)", result.name, result.confidence)
+            index = RestaurantIndex.load(notion, DB_ID)
+            log.info("loaded %d existing restaurant(s) for duplicate detection", index.loaded)
         except Exception:
-            log.exception("failed to process message %s", msg_id)
-            discord_react(token, channel_id, msg_id, REACTION_ERROR)
-
+            log.exception("failed to load restaurant index; duplicate detection disabled")
+
+    log.info("processing %d message(s)", len(jobs))
+    reactions = ReactionDispatcher(discord, channel_id, workers=REACTION_WORKERS)
+    pipeline = Pipeline(build_stages(reactions, gemini, notion, index))
+    try:
+        pipeline.run(jobs, on_done=on_done)
+    finally:
+        journal.close()
+        reactions.close()
+    if reactions.failures:
+        log.warning("%d reaction(s) failed", len(reactions.failures))
+        reactions.post_summary()
+
+    highest_id = watermark.value
+    if watermark.pending:
+        log.warning("%d message(s) did not finish; they will be retried next run", watermark.pending)
     state["last_message_id"] = highest_id
     save_state(state)
+    journal.compact(highest_id)
     log.info("Done. last_message_id=%s", highest_id)
+    llm_metrics.report("eat_later", out=log.info)
+    if extractor.page_cache:
+        log.info(extractor.page_cache.summary())
     return 0
 
 
@@ -1,12 +1,15 @@
+import codecs
 import json
 import logging
 import os
 import re
 import sys
-from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
 from html.parser import HTMLParser
 
 import requests
+from requests.adapters import HTTPAdapter
 
 log = logging.getLogger(__name__)
 
@@ -16,6 +19,30 @@ sys.path.insert(0, os.path.join(_here, ".."))
 sys.path.insert(0, _here)
 
 from common.gemini import GeminiClient
+from common.http_cache import CachedPage, page_cache_from_env
+
+MAX_PAGES = 3
+PAGE_TIMEOUT = 10
+# 單則訊息所有網頁抓取的總時限（秒），超過的頁面直接放棄
+PAGE_DEADLINE = 15
+# 每頁最多下載的位元組數，避免把超大頁面整個讀進記憶體
+MAX_PAGE_BYTES = 512 * 1024
+
+_session = requests.Session()
+_session.headers["User-Agent"] = "Mozilla/5.0 (compatible; EatLaterBot/1.0)"
+
+
+def configure_session(concurrency: int) -> None:
+    """依同時抓取的頁面數設定連線池大小；多則訊息並行抓取時由呼叫端設定（預設為 MAX_PAGES）。"""
+    adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+    _session.mount("https://", adapter)
+    _session.mount("http://", adapter)
+
+
+configure_session(MAX_PAGES)
+
+# 設定 PAGE_CACHE_PATH 時啟用；同一家餐廳的連結重複分享時不必重抓
+page_cache = page_cache_from_env()
 
 _URL_RE = re.compile(r"https?://[^\s\"'>]+(?<![.,;:!?)'\"）。，、])")
 
@@ -24,73 +51,237 @@ def extract_urls(content: str) -> list[str]:
     return _URL_RE.findall(content)
 
 
+BODY_PREVIEW_CHARS = 1500
+_READ_CHUNK = 16 * 1024
+_RESTAURANT_TYPES = {
+    "Restaurant", "FoodEstablishment", "CafeOrCoffeeShop", "BarOrPub",
+    "Bakery", "FastFoodRestaurant", "IceCreamShop", "Winery", "Brewery",
+}
+
+
+def _find_restaurant(node) -> dict | None:
+    """在 JSON-LD（可能是 list 或含 @graph）中找出第一個餐廳類型的物件。"""
+    if isinstance(node, list):
+        for item in node:
+            found = _find_restaurant(item)
+            if found:
+                return found
+        return None
+    if not isinstance(node, dict):
+        return None
+    types = node.get("@type")
+    types = types if isinstance(types, list) else [types]
+    if any(t in _RESTAURANT_TYPES for t in types):
+        return node
+    return _find_restaurant(node.get("@graph"))
+
+
 class _PageParser(HTMLParser):
+    """可分段餵入的 HTML 解析器；body 文字收滿 BODY_PREVIEW_CHARS 且找到餐廳 JSON-LD 後 done 為 True。"""
+
     def __init__(self):
         super().__init__()
         self.title = ""
         self.description = ""
+        self.og: dict[str, str] = {}
+        self.restaurant: dict | None = None
         self.body_texts: list[str] = []
+        self.body_chars = 0
         self._in_title = False
         self._in_body = False
         self._skip_tags = {"script", "style"}
         self._skip_depth = 0
+        self._jsonld: list[str] | None = None
+
+    @property
+    def preview_full(self) -> bool:
+        return self.body_chars >= BODY_PREVIEW_CHARS
+
+    @property
+    def done(self) -> bool:
+        # title / meta 在 head，但很多網站把 JSON-LD 放在 body 結尾；body 收滿後仍繼續讀，
+        # 直到找到餐廳 JSON-LD 為止（呼叫端另以 MAX_PAGE_BYTES 限制）
+        return self.preview_full and self.restaurant is not None
 
     def handle_starttag(self, tag, attrs):
+        attrs_dict = dict(attrs)
         if tag in self._skip_tags:
             self._skip_depth += 1
+        if tag == "script" and (attrs_dict.get("type") or "").lower() == "application/ld+json":
+            self._jsonld = []
         if tag == "title":
             self._in_title = True
         if tag == "body":
             self._in_body = True
         if tag == "meta":
-            attrs_dict = dict(attrs)
-            if attrs_dict.get("name", "").lower() == "description":
-                self.description = attrs_dict.get("content", "")
+            name = (attrs_dict.get("name") or attrs_dict.get("property") or "").lower()
+            content = attrs_dict.get("content") or ""
+            if name == "description":
+                self.description = content
+            elif name.startswith("og:") and content:
+                self.og.setdefault(name[3:], content)
 
     def handle_endtag(self, tag):
         if tag in self._skip_tags:
             self._skip_depth = max(0, self._skip_depth - 1)
+        if tag == "script" and self._jsonld is not None:
+            raw, self._jsonld = "".join(self._jsonld), None
+            if self.restaurant is None:
+                try:
+                    self.restaurant = _find_restaurant(json.loads(raw))
+                except ValueError:
+                    pass
         if tag == "title":
             self._in_title = False
 
     def handle_data(self, data):
+        if self._jsonld is not None:
+            self._jsonld.append(data)
+            return
         if self._in_title:
             self.title += data
-        if self._in_body and self._skip_depth == 0:
+        if self._in_body and self._skip_depth == 0 and not self.preview_full:
             stripped = data.strip()
             if stripped:
                 self.body_texts.append(stripped)
+                self.body_chars += len(stripped) + 1
 
 
-def fetch_page_text(url: str) -> str | None:
-    """抓取網頁 title + description + body 前 1500 字，失敗回傳 None。"""
-    try:
-        resp = requests.get(
-            url,
-            timeout=10,
-            headers={"User-Agent": "Mozilla/5.0 (compatible; EatLaterBot/1.0)"},
-        )
-        if resp.status_code != 200:
-            return None
-        content_type = resp.headers.get("Content-Type", "")
-        if "html" not in content_type:
-            return None
-        parser = _PageParser()
-        parser.feed(resp.text)
-        body_preview = " ".join(parser.body_texts)[:1500]
+def _format_address(address) -> str:
+    if isinstance(address, dict):
+        keys = ("addressRegion", "addressLocality", "streetAddress")
+        return " ".join(str(address[k]) for k in keys if address.get(k))
+    return str(address or "")
+
+
+def _restaurant_summary(data: dict) -> str:
+    rating = data.get("aggregateRating")
+    if isinstance(rating, dict):
+        rating = rating.get("ratingValue")
+    parts = []
+    for label, value in (
+        ("name", data.get("name")),
+        ("address", _format_address(data.get("address"))),
+        ("cuisine", data.get("servesCuisine")),
+        ("rating", rating),
+    ):
+        if isinstance(value, list):
+            value = ", ".join(str(v) for v in value)
+        if value:
+            parts.append(f"{label}={value}")
+    return "; ".join(parts)
+
+
+@dataclass
+class PageInfo:
+    url: str
+    title: str = ""
+    description: str = ""
+    og: dict[str, str] = field(default_factory=dict)
+    restaurant: dict | None = None
+    body: str = ""
+
+    def to_text(self) -> str | None:
         parts = []
-        if parser.title.strip():
-            parts.append(f"Title: {parser.title.strip()}")
-        if parser.description.strip():
-            parts.append(f"Description: {parser.description.strip()}")
-        if body_preview:
-            parts.append(f"Content: {body_preview}")
+        title = self.title or self.og.get("title", "")
+        description = self.description or self.og.get("description", "")
+        if title:
+            parts.append(f"Title: {title}")
+        if self.og.get("site_name"):
+            parts.append(f"Site: {self.og['site_name']}")
+        if description:
+            parts.append(f"Description: {description}")
+        if self.restaurant:
+            summary = _restaurant_summary(self.restaurant)
+            if summary:
+                parts.append(f"Restaurant: {summary}")
+        if self.body:
+            parts.append(f"Content: {self.body}")
         return "\n".join(parts) if parts else None
+
+
+def _from_cache(url: str) -> tuple[CachedPage | None, PageInfo | None]:
+    """讀取快取並還原成 PageInfo；快取讀取失敗或內容與 PageInfo 不符時視為沒有快取。"""
+    if not page_cache:
+        return None, None
+    try:
+        cached = page_cache.get(url)
+        if cached is None:
+            return None, None
+        return cached, PageInfo(**json.loads(cached.content))
     except Exception as exc:
-        log.debug("fetch_page_text failed for %s: %s", url, exc)
+        log.debug("ignoring page cache entry for %s: %s", url, exc)
+        return None, None
+
+
+def fetch_page(url: str) -> PageInfo | None:
+    """串流抓取網頁，邊下載邊解析；body 預覽收滿且找到餐廳 JSON-LD，或超過 MAX_PAGE_BYTES 就停止讀取。
+
+    有 page_cache 時，新鮮的快取直接使用；過期的以條件式 GET 重新驗證，304 時沿用。
+    """
+    cached, cached_page = _from_cache(url)
+    if cached and page_cache.is_fresh(cached):
+        return cached_page
+    try:
+        headers = cached.validators() if cached else {}
+        with _session.get(url, timeout=PAGE_TIMEOUT, stream=True, headers=headers) as resp:
+            if resp.status_code == 304 and cached:
+                page_cache.mark_revalidated(url)
+                return cached_page
+            if resp.status_code != 200:
+                return None
+            content_type = resp.headers.get("Content-Type", "")
+            if "html" not in content_type:
+                return None
+            decoder = codecs.getincrementaldecoder(resp.encoding or "utf-8")(errors="replace")
+            parser = _PageParser()
+            received = 0
+            for chunk in resp.iter_content(chunk_size=_READ_CHUNK):
+                received += len(chunk)
+                parser.feed(decoder.decode(chunk))
+                if parser.done or received >= MAX_PAGE_BYTES:
+                    break
+            parser.feed(decoder.decode(b"", final=True))
+        page = PageInfo(
+            url=url,
+            title=parser.title.strip(),
+            description=parser.description.strip(),
+            og=parser.og,
+            restaurant=parser.restaurant,
+            body=" ".join(parser.body_texts)[:BODY_PREVIEW_CHARS],
+        )
+        if page_cache:
+            page_cache.put(
+                url,
+                json.dumps(asdict(page), ensure_ascii=False),
+                etag=resp.headers.get("ETag"),
+                last_modified=resp.headers.get("Last-Modified"),
+            )
+        return page
+    except Exception as exc:
+        log.debug("fetch_page failed for %s: %s", url, exc)
         return None
 
 
+def fetch_page_text(url: str) -> str | None:
+    """抓取網頁 title + description + og / JSON-LD 餐廳資訊 + body 前 1500 字，失敗回傳 None。"""
+    page = fetch_page(url)
+    return page.to_text() if page else None
+
+
+def fetch_pages(urls: list[str], deadline: float = PAGE_DEADLINE) -> list[PageInfo | None]:
+    """並行抓取多個網頁，結果順序與 urls 相同；超過 deadline 仍未完成的視為 None。"""
+    if not urls:
+        return []
+    pool = ThreadPoolExecutor(max_workers=len(urls))
+    try:
+        futures = [pool.submit(fetch_page, url) for url in urls]
+        wait(futures, timeout=deadline)
+        return [f.result() if f.done() else None for f in futures]
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
 _EXTRACT_PROMPT = """你是餐廳資訊萃取助手。根據以下訊息，輸出一個 JSON 物件，欄位如下：
 - name: 餐廳名稱（字串，必填，找不到就用訊息第一行）
 - url: 餐廳網址（字串或 null）
@@ -106,7 +297,55 @@ _EXTRACT_PROMPT = """你是餐廳資訊萃取助手。根據以下訊息，輸
 {content}
 """
 
-_JSON_RE = re.compile(r"\{[\s\S]*\}")
+
+@dataclass
+class RestaurantInfo:
+    """LLM 回傳的結構，欄位對應 _EXTRACT_PROMPT。"""
+    name: str
+    url: str | None = None
+    region: str | None = None
+    town: str | None = None
+    types: list[str] = field(default_factory=list)
+    note: str = ""
+    rating: float | None = None
+
+
+_BATCH_PROMPT = """你是餐廳資訊萃取助手。以下有多則訊息，每則以 <<<訊息 id>>> 開頭。
+為每一則訊息各輸出一個物件，全部放在 items 陣列中，欄位如下：
+- id: 訊息 id（照抄 <<<>>> 中的內容）
+- name: 餐廳名稱（字串，必填，找不到就用訊息第一行）
+- url: 餐廳網址（字串或 null）
+- region: 地區，例如「台北市」「新北市」（字串或 null）
+- town: 鄉鎮區，例如「大安區」「板橋區」（字串或 null）
+- types: 料理類型陣列，例如 ["日式", "拉麵"]（陣列，找不到給 []）
+- note: 摘要或備註（字串，找不到給 ""）
+- rating: 評分數字 1-5（數字或 null）
+
+每則訊息各自獨立，不要混用其他訊息的資訊。只輸出 JSON，不要任何說明或 markdown。
+
+{messages}
+"""
+
+# 一次 prompt 最多合併的訊息數
+BATCH_MAX_ITEMS = 8
+
+
+@dataclass
+class BatchEntry:
+    """_BATCH_PROMPT 中單則訊息的結果；name 允許 null，驗證交給 extract_batch 逐筆處理。"""
+    id: str
+    name: str | None = None
+    url: str | None = None
+    region: str | None = None
+    town: str | None = None
+    types: list[str] = field(default_factory=list)
+    note: str = ""
+    rating: float | None = None
+
+
+@dataclass
+class BatchReply:
+    items: list[BatchEntry]
 
 
 @dataclass
@@ -121,37 +360,132 @@ class ExtractResult:
     confidence: str = "full"  # "full" or "partial"
 
 
+_REGION_TOWN_RE = re.compile(r"([^\d\s,，]{2}[市縣])\s*([^\d\s,，]{1,3}?[區鄉鎮市])")
+
+
+def _valid_region_town(region, town) -> bool:
+    return (
+        isinstance(region, str) and isinstance(town, str)
+        and region.endswith(("市", "縣")) and town.endswith(("區", "鄉", "鎮", "市"))
+        and region != town
+    )
+
+
+def _split_region_town(address) -> tuple[str | None, str | None]:
+    """從 schema.org address 取出縣市與鄉鎮區；結構化欄位不像縣市 / 鄉鎮區時改從街道地址比對。
+
+    都對不上時回傳 (None, None)，交給 LLM 判斷，避免把「台灣」「Taipei City」之類的值寫進 Notion。
+    """
+    if isinstance(address, dict):
+        region = str(address.get("addressRegion") or "").strip().replace("臺", "台")
+        town = str(address.get("addressLocality") or "").strip()
+        if _valid_region_town(region, town):
+            return region, town
+        street = str(address.get("streetAddress") or "")
+    else:
+        street = str(address or "")
+    m = _REGION_TOWN_RE.search(street.replace(" ", ""))
+    if m:
+        region, town = m.group(1).replace("臺", "台"), m.group(2)
+        if _valid_region_town(region, town):
+            return region, town
+    return None, None
+
+
+def _jsonld_rating(data: dict) -> float | None:
+    rating = data.get("aggregateRating")
+    if not isinstance(rating, dict):
+        return None
+    try:
+        value = float(rating["ratingValue"])
+        best = float(rating.get("bestRating") or 5)
+    except (KeyError, TypeError, ValueError):
+        return None
+    return round(value / best * 5, 1) if best > 0 else None
+
+
+def restaurant_from_jsonld(page: PageInfo, content: str) -> ExtractResult | None:
+    """頁面的 JSON-LD 餐廳資料有名稱、縣市、鄉鎮與料理類型時直接組出結果，否則回傳 None。"""
+    data = page.restaurant
+    if not data or not isinstance(data.get("name"), str) or not data["name"].strip():
+        return None
+    region, town = _split_region_town(data.get("address"))
+    cuisine = data.get("servesCuisine") or []
+    if isinstance(cuisine, str):
+        cuisine = re.split(r"\s*[,，、/]\s*", cuisine)
+    types = [str(t).strip() for t in cuisine if str(t).strip()]
+    if not (region and town and types):
+        return None
+    comment = _URL_RE.sub("", content).strip()
+    url = data.get("url") if isinstance(data.get("url"), str) else None
+    return ExtractResult(
+        name=data["name"].strip(),
+        url=url or page.url,
+        region=region,
+        town=town,
+        types=types,
+        note=comment or page.description or page.og.get("description", ""),
+        rating=_jsonld_rating(data),
+        confidence="full",
+    )
+
+
+def gather_pages(content: str) -> list[PageInfo]:
+    """抓取訊息中前 MAX_PAGES 個連結，只回傳成功的頁面。"""
+    return [page for page in fetch_pages(extract_urls(content)[:MAX_PAGES]) if page]
+
+
 def extract(content: str, gemini: GeminiClient) -> ExtractResult:
-    urls = extract_urls(content)
+    return extract_from_pages(content, gather_pages(content), gemini)
+
+
+def _structured_result(content: str, pages: list[PageInfo]) -> ExtractResult | None:
+    for page in pages:
+        result = restaurant_from_jsonld(page, content)
+        if result:
+            log.info("structured data found on %s, skipping LLM", page.url)
+            return result
+    return None
+
+
+def _page_context(content: str, pages: list[PageInfo]) -> str:
     page_parts = []
-    for url in urls[:3]:
-        text = fetch_page_text(url)
+    for page in pages:
+        text = page.to_text()
         if text:
-            page_parts.append(f"[來自 {url}]\n{text}")
+            page_parts.append(f"[來自 {page.url}]\n{text}")
+    if not page_parts:
+        return content
+    return content + "\n\n" + "\n\n".join(page_parts)
 
-    full_content = content
-    if page_parts:
-        full_content += "\n\n" + "\n\n".join(page_parts)
 
-    prompt = _EXTRACT_PROMPT.format(content=full_content)
+def _result_from_info(info, content: str) -> ExtractResult:
+    urls = extract_urls(content)
+    return ExtractResult(
+        name=info.name or content.strip().splitlines()[0][:80],
+        url=info.url or (urls[0] if urls else None),
+        region=info.region or None,
+        town=info.town or None,
+        types=info.types,
+        note=info.note,
+        rating=info.rating,
+        confidence="full",
+    )
+
+
+def extract_from_pages(content: str, pages: list[PageInfo], gemini: GeminiClient) -> ExtractResult:
+    """以已抓好的頁面萃取餐廳資訊：JSON-LD 完整時直接使用，否則交給 LLM。"""
+    result = _structured_result(content, pages)
+    if result:
+        return result
+
+    prompt = _EXTRACT_PROMPT.format(content=_page_context(content, pages))
     try:
-        reply = gemini.generate(prompt, timeout=30)
-        m = _JSON_RE.search(reply)
-        if not m:
-            raise ValueError("no JSON found")
-        data = json.loads(m.group())
-        return ExtractResult(
-            name=str(data.get("name") or content.strip().splitlines()[0][:80]),
-            url=data.get("url") or (urls[0] if urls else None),
-            region=data.get("region") or None,
-            town=data.get("town") or None,
-            types=[str(t) for t in (data.get("types") or [])],
-            note=str(data.get("note") or ""),
-            rating=float(data["rating"]) if data.get("rating") is not None else None,
-            confidence="full",
-        )
+        info = gemini.generate_json(prompt, RestaurantInfo, timeout=30)
+        return _result_from_info(info, content)
     except Exception as exc:
         log.warning("extract failed, falling back to partial: %s", exc)
+        urls = extract_urls(content)
         first_line = content.strip().splitlines()[0][:80] if content.strip() else "未知餐廳"
         return ExtractResult(
             name=first_line,
@@ -159,3 +493,58 @@ def extract(content: str, gemini: GeminiClient) -> ExtractResult:
             note=content[:2000],
             confidence="partial",
         )
+
+
+def _valid_entry(entry: BatchEntry) -> bool:
+    return bool(entry.name and entry.name.strip()) and (entry.rating is None or 0 <= entry.rating <= 5)
+
+
+def extract_batch(
+    items: list[tuple[str, str, list[PageInfo]]],
+    gemini: GeminiClient,
+    batch_size: int = BATCH_MAX_ITEMS,
+) -> dict[str, ExtractResult]:
+    """一次萃取多則訊息，items 為 (訊息 id, 內容, 頁面)，回傳以訊息 id 為 key 的結果。
+
+    每 batch_size 則合併成一個 prompt；回覆中缺少、重複或驗證失敗的項目（以及整批
+    呼叫失敗時的所有項目）再個別用 extract_from_pages 重跑。
+    """
+    results: dict[str, ExtractResult] = {}
+    pending: list[tuple[str, str, list[PageInfo]]] = []
+    for msg_id, content, pages in items:
+        result = _structured_result(content, pages)
+        if result:
+            results[msg_id] = result
+        else:
+            pending.append((msg_id, content, pages))
+
+    retry: list[tuple[str, str, list[PageInfo]]] = []
+    for start in range(0, len(pending), batch_size):
+        chunk = pending[start:start + batch_size]
+        if len(chunk) == 1:
+            retry.extend(chunk)
+            continue
+        messages = "\n\n".join(
+            f"<<<{msg_id}>>>\n{_page_context(content, pages)}" for msg_id, content, pages in chunk
+        )
+        try:
+            reply = gemini.generate_json(_BATCH_PROMPT.format(messages=messages), BatchReply, timeout=60)
+        except Exception as exc:
+            log.warning("batch extract failed for %d message(s), retrying individually: %s", len(chunk), exc)
+            retry.extend(chunk)
+            continue
+        entries: dict[str, list[BatchEntry]] = {}
+        for entry in reply.items:
+            entries.setdefault(entry.id.strip(), []).append(entry)
+        for msg_id, content, pages in chunk:
+            found = entries.get(msg_id, [])
+            if len(found) == 1 and _valid_entry(found[0]):
+                results[msg_id] = _result_from_info(found[0], content)
+            else:
+                retry.append((msg_id, content, pages))
+
+    if retry:
+        log.info("re-extracting %d message(s) individually", len(retry))
+    for msg_id, content, pages in retry:
+        results[msg_id] = extract_from_pages(content, pages, gemini)
+    return results
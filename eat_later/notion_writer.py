@@ -7,6 +7,7 @@ sys.path.insert(0, _here)
 
 from common.notion import NotionApi
 from extractor import ExtractResult
+from restaurant_index import IndexedRestaurant, RestaurantIndex
 
 DB_ID = "974f5e43cac84f818fe23f35e463286b"
 
@@ -28,8 +29,58 @@ def build_properties(result: ExtractResult) -> dict:
     return props
 
 
-def write(result: ExtractResult, notion: NotionApi) -> None:
-    properties = build_properties(result)
-    resp = notion.create_page(DB_ID, properties)
+def merge_properties(row: IndexedRestaurant, result: ExtractResult) -> dict:
+    """既有資料列缺少、而新結果有的欄位；類型取聯集。沒有可補的欄位時回傳空 dict。"""
+    props: dict = {}
+    if not row.url and result.url:
+        props["連結"] = {"url": result.url}
+    if not row.region and result.region:
+        props["地區"] = {"select": {"name": result.region}}
+    if not row.town and result.town:
+        props["鄉鎮"] = {"select": {"name": result.town}}
+    new_types = [t for t in result.types if t not in row.types]
+    if new_types:
+        props["類型"] = {"multi_select": [{"name": t} for t in row.types + new_types]}
+    if row.rating is None and result.rating is not None:
+        props["評級"] = {"number": result.rating}
+    return props
+
+
+def _check(resp) -> None:
     if resp.status_code not in (200, 201):
         raise RuntimeError(f"Notion API error {resp.status_code}: {resp.text[:200]}")
+
+
+def write(result: ExtractResult, notion: NotionApi, index: RestaurantIndex | None = None) -> str:
+    """寫入 Notion，回傳 "created" / "merged" / "skipped"。
+
+    有 index 時先查重複：已存在的餐廳只以 patch_page 補上缺少的欄位，沒有可補的就略過。
+    """
+    if index is None:
+        _check(notion.create_page(DB_ID, build_properties(result)))
+        return "created"
+
+    row, is_new = index.claim(result)
+    if is_new:
+        try:
+            resp = notion.create_page(DB_ID, build_properties(result))
+            _check(resp)
+        except Exception:
+            index.discard(row)
+            raise
+        index.update(row, page_id=resp.json()["id"])
+        return "created"
+
+    updates = merge_properties(row, result)
+    if not updates or row.page_id is None:
+        return "skipped"
+    _check(notion.patch_page(row.page_id, updates))
+    index.update(
+        row,
+        url=row.url or result.url,
+        region=row.region or result.region,
+        town=row.town or result.town,
+        types=row.types + [t for t in result.types if t not in row.types],
+        rating=row.rating if row.rating is not None else result.rating,
+    )
+    return "merged"
@@ -0,0 +1,130 @@
+"""以 bounded queue 串接的多階段處理管線，每個階段有自己的 worker 數。
+
+每個階段的輸出即為下一階段的輸入；階段函式 raise 時該項目直接丟棄（視為未完成），
+不影響其他項目。batch_size > 1 的階段一次收集多個項目，函式接收並回傳 list。
+
+Watermark 追蹤依序排列的 id 中「從頭連續完成」的最後一個，只有它之前的項目都
+完成了，state 才能往前推進。
+"""
+
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable
+
+log = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+@dataclass
+class Stage:
+    name: str
+    func: Callable[[Any], Any]
+    workers: int = 1
+    batch_size: int = 1
+    # 湊批次時等待後續項目的最長秒數
+    batch_wait: float = 0.5
+
+
+class Pipeline:
+    def __init__(self, stages: list[Stage], queue_size: int = 16) -> None:
+        self.stages = stages
+        self.queue_size = queue_size
+
+    def run(self, items: Iterable, on_done: Callable[[Any], None] | None = None) -> None:
+        """把 items 送進管線並等待全部處理完；on_done 會在最後一個階段完成的 worker thread 中呼叫。"""
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads: list[list[threading.Thread]] = []
+        for i, stage in enumerate(self.stages):
+            out = queues[i + 1] if i + 1 < len(queues) else None
+            group = [
+                threading.Thread(
+                    target=self._work,
+                    args=(stage, queues[i], out, on_done),
+                    name=f"{stage.name}-{n}",
+                    daemon=True,
+                )
+                for n in range(max(1, stage.workers))
+            ]
+            for t in group:
+                t.start()
+            threads.append(group)
+
+        for item in items:
+            queues[0].put(item)
+        # 依序關閉各階段：前一階段的 worker 全部結束後，下一階段才不會再有新項目
+        for q, group in zip(queues, threads):
+            for _ in group:
+                q.put(_STOP)
+            for t in group:
+                t.join()
+
+    @staticmethod
+    def _work(stage: Stage, inbox: queue.Queue, out: queue.Queue | None, on_done) -> None:
+        while True:
+            batch, stopped = _take(inbox, stage.batch_size, stage.batch_wait)
+            if batch:
+                try:
+                    results = stage.func(batch) if stage.batch_size > 1 else [stage.func(batch[0])]
+                except Exception:
+                    log.exception("stage %s failed", stage.name)
+                    results = []
+                for result in results:
+                    if out is not None:
+                        out.put(result)
+                    elif on_done is not None:
+                        try:
+                            on_done(result)
+                        except Exception:
+                            log.exception("on_done failed after stage %s", stage.name)
+            if stopped:
+                return
+
+
+def _take(inbox: queue.Queue, size: int, wait: float) -> tuple[list, bool]:
+    """取出最多 size 個項目；回傳 (項目, 是否收到結束訊號)。"""
+    item = inbox.get()
+    if item is _STOP:
+        return [], True
+    batch = [item]
+    deadline = time.monotonic() + wait
+    while len(batch) < size:
+        try:
+            item = inbox.get(timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Empty:
+            break
+        if item is _STOP:
+            return batch, True
+        batch.append(item)
+    return batch, False
+
+
+class Watermark:
+    """依序排列的 id 中，從頭連續完成的最後一個 id（都沒完成時為 start）。"""
+
+    def __init__(self, ids: list[str], start: str | None = None) -> None:
+        self._ids = ids
+        self._done: set[str] = set()
+        self._next = 0
+        self._value = start
+        self._lock = threading.Lock()
+
+    def done(self, id_: str) -> None:
+        with self._lock:
+            self._done.add(id_)
+            while self._next < len(self._ids) and self._ids[self._next] in self._done:
+                self._value = self._ids[self._next]
+                self._next += 1
+
+    @property
+    def value(self) -> str | None:
+        with self._lock:
+            return self._value
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._ids) - len(self._done)
@@ -0,0 +1,87 @@
+"""逐則訊息的處理進度紀錄（append-only JSON Lines），讓中斷後的重跑跳過已完成的訊息。
+
+state.json 的 last_message_id 只在執行結束時前進，而且只能越過「從頭連續完成」的訊息；
+每則訊息完成時另外在 journal 附加一行並 fsync，執行被中途砍掉時也不會遺失。
+下次執行時 journal 中已有的訊息直接視為完成；state 前進後再把 last_message_id 之前的紀錄清掉。
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+
+def write_atomic(path: Path, text: str) -> None:
+    """先寫到同目錄的暫存檔再 os.replace，讀者只會看到完整的舊檔或新檔。"""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+class ProgressJournal:
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+        self._file = None
+        self._lock = threading.Lock()
+
+    def load(self) -> dict[str, str]:
+        """回傳 {訊息 id: outcome}；最後一行若因中斷而不完整則略過。"""
+        done: dict[str, str] = {}
+        if not self.path.exists():
+            return done
+        with self.path.open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    log.warning("ignoring malformed progress entry: %r", line[:80])
+                    continue
+                done[entry["id"]] = entry.get("outcome", "")
+        return done
+
+    def record(self, msg_id: str, outcome: str) -> None:
+        line = json.dumps({"id": msg_id, "outcome": outcome, "at": time.time()}, ensure_ascii=False)
+        with self._lock:
+            if self._file is None:
+                self._file = self.path.open("a", encoding="utf-8")
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def compact(self, upto: str | None) -> None:
+        """移除 id <= upto 的紀錄（它們已由 state 的 last_message_id 涵蓋）。"""
+        with self._lock:
+            self._close()
+            entries = [
+                (msg_id, outcome) for msg_id, outcome in self.load().items()
+                if upto is None or int(msg_id) > int(upto)
+            ]
+            if not entries:
+                self.path.unlink(missing_ok=True)
+                return
+            write_atomic(self.path, "".join(
+                json.dumps({"id": msg_id, "outcome": outcome}, ensure_ascii=False) + "\n"
+                for msg_id, outcome in entries
+            ))
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+    def _close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,127 @@
+"""Notion 餐廳資料庫的本地索引，用來在寫入前偵測重複分享的餐廳。
+
+每次執行以分頁查詢載入一次，之後每寫入一筆就同步更新。以兩種 key 查找：
+  - 正規化後的 URL（同一個連結再次分享）
+  - 正規化後的名稱 + 鄉鎮（不同連結但同一家店）
+"""
+
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass, field
+
+from common.http_cache import normalize_url
+from common.notion import NotionApi
+from extractor import ExtractResult
+
+_NAME_NOISE_RE = re.compile(r"[\s\W_]+")
+
+
+def normalize_name(name: str) -> str:
+    return _NAME_NOISE_RE.sub("", unicodedata.normalize("NFKC", name).casefold())
+
+
+@dataclass
+class IndexedRestaurant:
+    page_id: str | None
+    name: str
+    url: str | None = None
+    region: str | None = None
+    town: str | None = None
+    types: list[str] = field(default_factory=list)
+    rating: float | None = None
+
+    @classmethod
+    def from_page(cls, page: dict) -> "IndexedRestaurant":
+        props = page.get("properties") or {}
+
+        def text(name: str) -> str:
+            prop = props.get(name) or {}
+            return "".join(t.get("plain_text", "") for t in prop.get("title") or prop.get("rich_text") or [])
+
+        def select(name: str) -> str | None:
+            return ((props.get(name) or {}).get("select") or {}).get("name")
+
+        return cls(
+            page_id=page["id"],
+            name=text("Name"),
+            url=(props.get("連結") or {}).get("url"),
+            region=select("地區"),
+            town=select("鄉鎮"),
+            types=[o["name"] for o in (props.get("類型") or {}).get("multi_select") or []],
+            rating=(props.get("評級") or {}).get("number"),
+        )
+
+    @classmethod
+    def from_result(cls, result: ExtractResult) -> "IndexedRestaurant":
+        return cls(None, result.name, result.url, result.region, result.town, list(result.types), result.rating)
+
+
+class RestaurantIndex:
+    def __init__(self) -> None:
+        self._by_url: dict[str, IndexedRestaurant] = {}
+        self._by_name: dict[tuple[str, str], IndexedRestaurant] = {}
+        self.loaded = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, notion: NotionApi, database_id: str) -> "RestaurantIndex":
+        index = cls()
+        for page in notion.iter_query(database_id, prefetch=True):
+            index._add(IndexedRestaurant.from_page(page))
+            index.loaded += 1
+        return index
+
+    @staticmethod
+    def _keys(row: IndexedRestaurant) -> tuple[str | None, tuple[str, str] | None]:
+        url_key = normalize_url(row.url) if row.url else None
+        name = normalize_name(row.name) if row.name else ""
+        # 沒有鄉鎮時只比對 URL，避免連鎖店或同名店被誤判為重複
+        name_key = (name, normalize_name(row.town)) if name and row.town else None
+        return url_key, name_key
+
+    def _add(self, row: IndexedRestaurant) -> None:
+        url_key, name_key = self._keys(row)
+        if url_key:
+            self._by_url.setdefault(url_key, row)
+        if name_key:
+            self._by_name.setdefault(name_key, row)
+
+    def _find(self, row: IndexedRestaurant) -> IndexedRestaurant | None:
+        url_key, name_key = self._keys(row)
+        return (url_key and self._by_url.get(url_key)) or (name_key and self._by_name.get(name_key)) or None
+
+    def find_url(self, urls: list[str]) -> IndexedRestaurant | None:
+        """任一連結已在資料庫中時回傳該筆。"""
+        with self._lock:
+            for url in urls:
+                row = self._by_url.get(normalize_url(url))
+                if row:
+                    return row
+        return None
+
+    def claim(self, result: ExtractResult) -> tuple[IndexedRestaurant, bool]:
+        """查找重複；沒有重複時先登記一筆（page_id 為 None）。回傳 (資料列, 是否為新登記)。
+
+        查找與登記在同一個 lock 內完成，同時處理的兩則訊息不會都被當成新餐廳。
+        """
+        candidate = IndexedRestaurant.from_result(result)
+        with self._lock:
+            existing = self._find(candidate)
+            if existing:
+                return existing, False
+            self._add(candidate)
+            return candidate, True
+
+    def update(self, row: IndexedRestaurant, **changes) -> None:
+        with self._lock:
+            for name, value in changes.items():
+                setattr(row, name, value)
+            self._add(row)
+
+    def discard(self, row: IndexedRestaurant) -> None:
+        """寫入失敗時移除先前 claim 登記的資料列。"""
+        with self._lock:
+            for index in (self._by_url, self._by_name):
+                for key in [k for k, v in index.items() if v is row]:
+                    del index[key]
@@ -0,0 +1,123 @@
+import sys, os
+import threading
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import requests
+from unittest.mock import MagicMock, patch
+from common.discord import DiscordClient, ReactionDispatcher, _Bucket, route_key
+
+
+def test_route_key_keeps_major_parameter_and_masks_other_ids():
+    path = "/channels/1498113717286600847/messages/1500000000000000001/reactions/%E2%9C%85/@me"
+    assert route_key("PUT", path) == (
+        "PUT /channels/:major/messages/:id/reactions/:emoji/@me",
+        "1498113717286600847",
+    )
+    assert route_key("GET", "/users/@me") == ("GET /users/@me", "")
+
+
+def _acquire_in_thread(bucket: _Bucket) -> threading.Event:
+    acquired = threading.Event()
+
+    def run():
+        bucket.acquire()
+        acquired.set()
+
+    threading.Thread(target=run, daemon=True).start()
+    return acquired
+
+
+def test_bucket_waits_for_reset_then_lets_one_probe_through():
+    bucket = _Bucket()
+    bucket.acquire()  # 還沒有任何 header：第一個請求是探測
+    bucket.update(remaining=1, reset_after=0.2, window=100.0, received=time.monotonic())
+    bucket.acquire()  # 用掉視窗內最後一個額度
+
+    first = _acquire_in_thread(bucket)
+    second = _acquire_in_thread(bucket)
+    # 額度用完：重置前都不放行，重置後只放行一個探測
+    assert not first.wait(0.1) and not second.is_set()
+    time.sleep(0.2)
+    assert sum(e.is_set() for e in (first, second)) == 1
+
+    # 上一個視窗遲到的回應不會把額度加回去
+    bucket.update(remaining=5, reset_after=1.0, window=100.0, received=time.monotonic())
+    bucket.update(remaining=4, reset_after=1.0, window=99.0, received=time.monotonic())
+    assert bucket.remaining == 0
+    assert not (first.is_set() and second.is_set())
+
+    # 探測帶回新視窗的 header 後，等待中的請求依 remaining 放行
+    bucket.update(remaining=2, reset_after=1.0, window=101.0, received=time.monotonic())
+    assert first.wait(1) and second.wait(1)
+    assert bucket.remaining == 1
+
+
+def test_bucket_only_lowers_remaining_within_a_window():
+    bucket = _Bucket()
+    now = time.monotonic()
+    bucket.update(remaining=3, reset_after=1.0, window=100.0, received=now)
+    bucket.update(remaining=4, reset_after=1.0, window=100.0, received=now)
+    assert bucket.remaining == 3
+    bucket.update(remaining=1, reset_after=1.0, window=100.0, received=now)
+    assert bucket.remaining == 1
+
+
+def test_client_moves_route_to_shared_bucket_hash():
+    client = DiscordClient("token")
+    resp = MagicMock(headers={
+        "X-RateLimit-Bucket": "abc",
+        "X-RateLimit-Remaining": "4",
+        "X-RateLimit-Reset-After": "1.0",
+        "X-RateLimit-Reset": "100.0",
+    })
+    before = client._bucket("PUT /channels/:major/messages/:id/reactions/:emoji/@me", "1")
+    client._update_bucket("PUT /channels/:major/messages/:id/reactions/:emoji/@me", "1", resp)
+    client._update_bucket("DELETE /channels/:major/messages/:id/reactions/:emoji/@me", "1", resp)
+
+    after = client._bucket("PUT /channels/:major/messages/:id/reactions/:emoji/@me", "1")
+    assert after is before
+    assert client._bucket("DELETE /channels/:major/messages/:id/reactions/:emoji/@me", "1") is after
+    assert client._bucket("PUT /channels/:major/messages/:id/reactions/:emoji/@me", "2") is not after
+    assert after.remaining == 4
+
+
+def test_dispatcher_sends_each_reaction_once():
+    client = MagicMock()
+    client.react.return_value = (True, "")
+    with ReactionDispatcher(client, "c1", workers=2) as dispatcher:
+        assert dispatcher.submit("m1", "✅")
+        assert not dispatcher.submit("m1", "✅")
+        assert dispatcher.submit("m1", "🔁")
+        assert dispatcher.submit("m2", "✅")
+    assert client.react.call_count == 3
+    assert dispatcher.post_summary()
+    client.post_message.assert_not_called()
+
+
+def test_dispatcher_summary_fits_in_one_message():
+    client = MagicMock()
+    client.react.return_value = (False, "權限不足 (HTTP 403)")
+    client.post_message.return_value = True
+    with ReactionDispatcher(client, "c1") as dispatcher:
+        for i in range(200):
+            dispatcher.submit(f"15000000000000{i:05d}", "❌")
+
+    assert dispatcher.post_summary()
+    client.post_message.assert_called_once()
+    channel_id, content = client.post_message.call_args.args
+    assert channel_id == "c1"
+    assert len(content) <= 2000
+    assert content.startswith("⚠️ 有 200 個 reaction")
+    assert content.endswith("- …")
+
+
+def test_request_returns_later_response_after_network_error_without_final_sleep():
+    client = DiscordClient("token", max_retries=2, log=lambda msg: None)
+    server_error = MagicMock(status_code=503, headers={})
+    client.session.request = MagicMock(side_effect=[requests.ConnectionError("reset"), server_error])
+    with patch("common.discord.time.sleep") as sleep:
+        ok, reason = client.react("1", "2", "✅")
+    assert not ok
+    assert reason == "Discord 伺服器錯誤 (HTTP 503)"
+    sleep.assert_called_once_with(1)
@@ -1,8 +1,16 @@
+import json
 import sys, os
+import time
+import pytest
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
 from unittest.mock import MagicMock, patch
-from extractor import extract_urls, extract, ExtractResult
+from extractor import (
+    extract_urls, extract, extract_batch, fetch_page, fetch_pages,
+    BatchReply, ExtractResult, PageInfo, RestaurantInfo, _split_region_town,
+)
+from common.http_cache import PageCache
+from common.llm_schema import coerce_dataclass, parse_json_reply
 
 
 def test_extract_urls_finds_https():
@@ -20,8 +28,9 @@ def test_extract_urls_empty():
 
 
 def _make_gemini(reply: str) -> MagicMock:
+    """generate_json 以真實的解析與驗證處理 reply，失敗時 raise ValueError。"""
     g = MagicMock()
-    g.generate.return_value = reply
+    g.generate_json.side_effect = lambda prompt, schema, **kw: coerce_dataclass(schema, parse_json_reply(reply))
     return g
 
 
@@ -30,7 +39,7 @@ def test_extract_full_json():
         '{"name":"鼎泰豐","url":"https://dtf.com","region":"台北市",'
         '"town":"大安區","types":["台式","小籠包"],"note":"必點XO醬","rating":4.5}'
     )
-    with patch("extractor.fetch_page_text", return_value=None):
+    with patch("extractor.fetch_page", return_value=None):
         result = extract("https://dtf.com 鼎泰豐超讚", gemini)
     assert result.name == "鼎泰豐"
     assert result.region == "台北市"
@@ -42,7 +51,7 @@ def test_extract_full_json():
 
 def test_extract_partial_fallback_on_bad_json():
     gemini = _make_gemini("抱歉我無法解析這個")
-    with patch("extractor.fetch_page_text", return_value=None):
+    with patch("extractor.fetch_page", return_value=None):
         result = extract("https://example.com 好吃的餐廳", gemini)
     assert result.confidence == "partial"
     assert result.url == "https://example.com"
@@ -55,3 +64,232 @@ def test_extract_no_url():
     assert result.name == "某餐廳"
     assert result.url is None
     assert result.confidence == "full"
+
+
+def test_extract_uses_structured_schema():
+    gemini = _make_gemini('{"name":"某餐廳"}')
+    extract("某餐廳", gemini)
+    assert gemini.generate_json.call_args.args[1] is RestaurantInfo
+
+
+def test_extract_partial_fallback_on_schema_mismatch():
+    gemini = _make_gemini(json.dumps({"name": "某餐廳", "rating": "很好"}))
+    result = extract("某餐廳 很好吃", gemini)
+    assert result.confidence == "partial"
+    assert result.name == "某餐廳 很好吃"
+
+
+def test_fetch_pages_keeps_order_and_drops_slow_pages():
+    def fake_fetch(url):
+        if url == "https://slow.example":
+            time.sleep(1)
+        return PageInfo(url=url)
+
+    with patch("extractor.fetch_page", side_effect=fake_fetch):
+        texts = fetch_pages(["https://a.example", "https://slow.example", "https://b.example"], deadline=0.3)
+    assert texts == [PageInfo(url="https://a.example"), None, PageInfo(url="https://b.example")]
+
+
+def _fake_response(html: str, chunk_size: int = 1024):
+    data = html.encode("utf-8")
+    chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+    consumed = []
+
+    def iter_content(chunk_size=None):
+        for chunk in chunks:
+            consumed.append(chunk)
+            yield chunk
+
+    resp = MagicMock()
+    resp.status_code = 200
+    resp.headers = {"Content-Type": "text/html; charset=utf-8"}
+    resp.encoding = "utf-8"
+    resp.iter_content = iter_content
+    resp.__enter__.return_value = resp
+    return resp, chunks, consumed
+
+
+_RAMEN_JSONLD = (
+    '<script type="application/ld+json">'
+    '{"@type": "Restaurant", "name": "好吃拉麵", "address": {"addressRegion": "台北市", "addressLocality": "中山區"}}'
+    '</script>'
+)
+
+
+def test_fetch_page_stops_reading_once_preview_is_full():
+    html = (f"<html><head><title>好吃拉麵</title>{_RAMEN_JSONLD}</head><body>"
+            + "<p>湯頭濃郁</p>" * 5000 + "</body></html>")
+    resp, chunks, consumed = _fake_response(html)
+    with patch("extractor._session.get", return_value=resp):
+        page = fetch_page("https://blog.example/ramen")
+    assert page.title == "好吃拉麵"
+    assert len(page.body) == 1500
+    assert len(consumed) < len(chunks) / 10
+
+
+def test_fetch_page_keeps_reading_for_jsonld_at_end_of_body():
+    html = ("<html><head><title>好吃拉麵</title></head><body>"
+            + "<p>湯頭濃郁</p>" * 5000 + f"{_RAMEN_JSONLD}</body></html>")
+    resp, chunks, consumed = _fake_response(html)
+    with patch("extractor._session.get", return_value=resp):
+        page = fetch_page("https://blog.example/ramen")
+    assert len(page.body) == 1500
+    assert page.restaurant["name"] == "好吃拉麵"
+
+
+def test_fetch_page_without_jsonld_stops_at_byte_cap():
+    html = "<html><head><title>好吃拉麵</title></head><body>" + "<p>湯頭濃郁</p>" * 50000 + "</body></html>"
+    resp, chunks, consumed = _fake_response(html)
+    with patch("extractor._session.get", return_value=resp), patch("extractor.MAX_PAGE_BYTES", 64 * 1024):
+        page = fetch_page("https://blog.example/ramen")
+    assert len(page.body) == 1500
+    assert page.restaurant is None
+    assert sum(len(c) for c in consumed) < 64 * 1024 + len(chunks[0])
+
+
+def test_fetch_page_picks_up_og_and_restaurant_jsonld():
+    html = """<html><head>
+    <meta property="og:site_name" content="美食部落格">
+    <meta property="og:description" content="台北最強拉麵">
+    <script type="application/ld+json">
+    {"@context": "https://schema.org", "@graph": [
+      {"@type": "WebPage", "name": "ignored"},
+      {"@type": "Restaurant", "name": "麵屋一燈", "servesCuisine": ["拉麵"],
+       "address": {"addressRegion": "台北市", "addressLocality": "中山區"}}
+    ]}
+    </script></head><body><p>內文</p></body></html>"""
+    resp, _, _ = _fake_response(html, chunk_size=64)
+    with patch("extractor._session.get", return_value=resp):
+        page = fetch_page("https://blog.example/ramen")
+    assert page.og == {"site_name": "美食部落格", "description": "台北最強拉麵"}
+    assert page.restaurant["name"] == "麵屋一燈"
+    text = page.to_text()
+    assert "Description: 台北最強拉麵" in text
+    assert "Restaurant: name=麵屋一燈; address=台北市 中山區; cuisine=拉麵" in text
+
+
+def test_fetch_page_revalidates_stale_cache_entry():
+    cache = PageCache(":memory:", fresh_for=0)
+    html = "<html><head><title>麵屋</title></head><body><p>內文</p></body></html>"
+    resp, _, _ = _fake_response(html)
+    resp.headers["ETag"] = '"v1"'
+    with patch("extractor.page_cache", cache), patch("extractor._session.get", return_value=resp):
+        first = fetch_page("https://blog.example/ramen?utm_source=ig")
+
+    not_modified = MagicMock(status_code=304, headers={})
+    not_modified.__enter__.return_value = not_modified
+    with patch("extractor.page_cache", cache), \
+            patch("extractor._session.get", return_value=not_modified) as get:
+        second = fetch_page("https://blog.example/ramen")
+
+    assert get.call_args.kwargs["headers"] == {"If-None-Match": '"v1"'}
+    assert second == first
+    assert cache.revalidated == 1
+
+
+def test_fetch_page_refetches_when_cache_entry_cannot_be_decoded():
+    cache = PageCache(":memory:")
+    cache.put("https://blog.example/ramen", json.dumps({"url": "https://blog.example/ramen", "old_field": 1}))
+    resp, _, _ = _fake_response("<html><head><title>麵屋</title></head></html>")
+    with patch("extractor.page_cache", cache), patch("extractor._session.get", return_value=resp) as get:
+        page = fetch_page("https://blog.example/ramen")
+
+    assert get.call_args.kwargs["headers"] == {}
+    assert page.title == "麵屋"
+
+
+_JSONLD_RESTAURANT = {
+    "@type": "Restaurant",
+    "name": "鼎泰豐 信義店",
+    "address": {"streetAddress": "臺北市大安區信義路二段194號"},
+    "servesCuisine": "台菜, 小籠包",
+    "aggregateRating": {"ratingValue": 9, "bestRating": 10},
+}
+
+
+def test_extract_skips_llm_when_jsonld_is_complete():
+    gemini = MagicMock()
+    page = PageInfo(url="https://maps.example/dtf", restaurant=_JSONLD_RESTAURANT)
+    with patch("extractor.fetch_page", return_value=page):
+        result = extract("必吃 https://maps.example/dtf", gemini)
+    gemini.generate_json.assert_not_called()
+    assert result == ExtractResult(
+        name="鼎泰豐 信義店",
+        url="https://maps.example/dtf",
+        region="台北市",
+        town="大安區",
+        types=["台菜", "小籠包"],
+        note="必吃",
+        rating=4.5,
+        confidence="full",
+    )
+
+
+def test_extract_uses_llm_when_jsonld_is_incomplete():
+    gemini = _make_gemini('{"name": "鼎泰豐", "region": "台北市", "town": "大安區", "types": ["台菜"]}')
+    page = PageInfo(url="https://maps.example/dtf", restaurant={**_JSONLD_RESTAURANT, "servesCuisine": []})
+    with patch("extractor.fetch_page", return_value=page):
+        result = extract("https://maps.example/dtf", gemini)
+    gemini.generate_json.assert_called_once()
+    assert "Restaurant: name=鼎泰豐 信義店" in gemini.generate_json.call_args.args[0]
+    assert result.types == ["台菜"]
+
+
+@pytest.mark.parametrize("address, expected", [
+    ({"addressRegion": "台灣", "addressLocality": "台北市", "streetAddress": "…"}, (None, None)),
+    ({"addressRegion": "TW", "addressLocality": "Taipei City"}, (None, None)),
+    ({"addressRegion": "台北市", "addressLocality": "台北市"}, (None, None)),
+    ({"addressRegion": "TW", "addressLocality": "Taipei", "streetAddress": "臺北市大安區信義路二段194號"},
+     ("台北市", "大安區")),
+    ({"addressRegion": "臺中市", "addressLocality": "西屯區"}, ("台中市", "西屯區")),
+])
+def test_split_region_town_rejects_values_that_are_not_county_and_town(address, expected):
+    assert _split_region_town(address) == expected
+
+
+def test_extract_uses_llm_when_jsonld_address_is_not_a_taiwan_region():
+    gemini = _make_gemini('{"name": "鼎泰豐", "region": "台北市", "town": "大安區", "types": ["台菜"]}')
+    restaurant = {**_JSONLD_RESTAURANT, "address": {"addressRegion": "TW", "addressLocality": "Taipei City"}}
+    page = PageInfo(url="https://maps.example/dtf", restaurant=restaurant)
+    with patch("extractor.fetch_page", return_value=page):
+        result = extract("https://maps.example/dtf", gemini)
+    gemini.generate_json.assert_called_once()
+    assert (result.region, result.town) == ("台北市", "大安區")
+
+
+def test_extract_batch_reruns_only_invalid_items_individually():
+    batch_reply = json.dumps({"items": [
+        {"id": "1", "name": "鼎泰豐", "region": "台北市", "town": "大安區", "types": ["台菜"]},
+        {"id": "2", "name": None, "types": []},
+        {"id": "3", "name": "一蘭", "types": ["拉麵"], "rating": 4},
+    ]}, ensure_ascii=False)
+    single_reply = '{"name": "阿宗麵線", "types": ["小吃"]}'
+
+    def generate_json(prompt, schema, **kw):
+        reply = batch_reply if schema is BatchReply else single_reply
+        return coerce_dataclass(schema, parse_json_reply(reply))
+
+    gemini = MagicMock()
+    gemini.generate_json.side_effect = generate_json
+    items = [("1", "鼎泰豐", []), ("2", "阿宗麵線", []), ("3", "一蘭 https://ichiran.example", [])]
+    results = extract_batch(items, gemini)
+
+    assert gemini.generate_json.call_count == 2
+    batch_prompt = gemini.generate_json.call_args_list[0].args[0]
+    assert "<<<1>>>" in batch_prompt and "<<<3>>>" in batch_prompt
+    assert results["1"].name == "鼎泰豐" and results["1"].town == "大安區"
+    assert results["2"].name == "阿宗麵線" and results["2"].types == ["小吃"]
+    assert results["3"].url == "https://ichiran.example" and results["3"].rating == 4.0
+
+
+def test_extract_batch_falls_back_to_single_calls_when_batch_fails():
+    def generate_json(prompt, schema, **kw):
+        if schema is BatchReply:
+            raise ValueError("bad batch")
+        return RestaurantInfo(name="單筆")
+
+    gemini = MagicMock()
+    gemini.generate_json.side_effect = generate_json
+    results = extract_batch([("1", "a", []), ("2", "b", [])], gemini)
+    assert {k: v.name for k, v in results.items()} == {"1": "單筆", "2": "單筆"}
+    assert gemini.generate_json.call_count == 3
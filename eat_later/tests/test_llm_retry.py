@@ -0,0 +1,76 @@
+import sys, os
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import httpx
+import pytest
+from google.genai import errors
+from common.llm_retry import RateLimiter, RetryPolicy, server_retry_delay, shared_limiter
+
+
+def _error(cls, code: int, details: list | None = None, headers: dict | None = None):
+    body = {"error": {"code": code, "message": "boom", "status": "X", "details": details or []}}
+    response = httpx.Response(code, headers=headers or {}, request=httpx.Request("POST", "https://llm.example"))
+    return cls(code, body, response)
+
+
+_RETRY_INFO = [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "7s"}]
+
+
+@pytest.mark.parametrize("code", [400, 401, 403, 404])
+def test_client_errors_fail_fast(code):
+    assert RetryPolicy().delay_for(_error(errors.ClientError, code), 0, 0.0) is None
+
+
+def test_rate_limit_uses_server_retry_info():
+    exc = _error(errors.ClientError, 429, details=_RETRY_INFO)
+    assert server_retry_delay(exc) == 7.0
+    assert RetryPolicy().delay_for(exc, 0, 0.0) == 7.0
+
+
+def test_rate_limit_falls_back_to_retry_after_header():
+    exc = _error(errors.ClientError, 429, headers={"Retry-After": "3"})
+    assert RetryPolicy().delay_for(exc, 0, 0.0) == 3.0
+
+
+def test_server_errors_back_off_exponentially():
+    policy = RetryPolicy(base_delay=2.0, max_delay=60.0)
+    exc = _error(errors.ServerError, 503)
+    assert 2.0 <= policy.delay_for(exc, 1, 0.0) <= 4.0
+    assert 8.0 <= policy.delay_for(exc, 3, 0.0) <= 16.0
+
+
+def test_transport_timeouts_are_retried_but_unknown_errors_are_not():
+    policy = RetryPolicy()
+    assert policy.delay_for(httpx.ReadTimeout("slow"), 0, 0.0) is not None
+    assert policy.delay_for(TimeoutError(), 0, 0.0) is not None
+    assert policy.delay_for(ValueError("bad prompt"), 0, 0.0) is None
+
+
+def test_retries_stop_at_deadline_and_max_attempts():
+    policy = RetryPolicy(max_attempts=3, deadline=300.0)
+    exc = _error(errors.ClientError, 429, details=_RETRY_INFO)
+    assert policy.delay_for(exc, 0, 290.0) == 7.0
+    assert policy.delay_for(exc, 0, 295.0) is None
+    assert policy.delay_for(exc, 2, 0.0) is None
+
+
+def test_rate_limiter_pause_blocks_every_caller():
+    limiter = RateLimiter()
+    assert limiter.acquire(10) == 0.0
+    limiter.pause(0.1)
+    start = time.monotonic()
+    waited = limiter.acquire(10)
+    assert waited >= 0.09
+    assert time.monotonic() - start >= 0.09
+
+
+def test_rate_limiter_enforces_token_budget():
+    limiter = RateLimiter(tpm=600)  # 每秒補 10 個 token，最多 600
+    assert limiter.acquire(600) == 0.0
+    assert 0.15 <= limiter.acquire(2) <= 0.4
+
+
+def test_shared_limiter_is_shared_per_model():
+    assert shared_limiter("test-model-a") is shared_limiter("test-model-a")
+    assert shared_limiter("test-model-a") is not shared_limiter("test-model-b")
@@ -0,0 +1,131 @@
+import sys, os
+import json
+import threading
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import pytest
+import requests
+from unittest.mock import MagicMock, patch
+from common.notion import NotionApi
+from common.ratelimit import TokenBucket
+
+
+def _response(status: int, body: dict | None = None, headers: dict | None = None):
+    resp = MagicMock(status_code=status, headers=headers or {})
+    resp.json.return_value = body or {}
+    return resp
+
+
+def _name(data: str) -> str:
+    return json.loads(data)["properties"]["Name"]
+
+
+def test_bulk_create_pages_retries_429_and_keeps_input_order():
+    api = NotionApi("token", rate_limit=1000)
+    throttled = set()
+    lock = threading.Lock()
+
+    def request(method, url, data=None, timeout=None):
+        name = _name(data)
+        with lock:
+            if name in ("b", "d") and name not in throttled:
+                throttled.add(name)
+                return _response(429, headers={"Retry-After": "0.25"})
+        # time.sleep 被 patch 掉了，改用 Event.wait 讓後面的項目先完成
+        threading.Event().wait(0.01 * (5 - ord(name) + ord("a")))
+        return _response(201, {"id": name})
+
+    api.session.request = MagicMock(side_effect=request)
+    with patch("common.notion.time.sleep") as sleep, patch.object(api._bucket, "pause") as pause:
+        results = api.bulk_create_pages("db", [{"Name": n} for n in "abcde"], max_workers=3)
+
+    assert [r.properties["Name"] for r in results] == list("abcde")
+    assert all(r.ok for r in results)
+    assert [r.response.json()["id"] for r in results] == list("abcde")
+    assert api.session.request.call_count == 7
+    pause.assert_called_with(0.25)
+    assert pause.call_count == 2
+    assert sleep.call_args_list.count(((0.25,),)) == 2
+
+
+def test_bulk_create_pages_reports_errors_per_item():
+    api = NotionApi("token", rate_limit=1000)
+
+    def request(method, url, data=None, timeout=None):
+        if _name(data) == "bad":
+            raise requests.ConnectionError("reset")
+        return _response(200, {"id": "ok"})
+
+    api.session.request = MagicMock(side_effect=request)
+    with patch("common.notion.time.sleep"):
+        results = api.bulk_create_pages("db", [{"Name": "ok"}, {"Name": "bad"}], max_retries=1)
+
+    assert results[0].ok
+    assert not results[1].ok and isinstance(results[1].error, requests.ConnectionError)
+
+
+def test_create_page_retries_through_shared_bucket():
+    api = NotionApi("token", rate_limit=1000)
+    api.session.request = MagicMock(side_effect=[_response(503), _response(200, {"id": "p"})])
+    with patch("common.notion.time.sleep") as sleep:
+        resp = api.create_page("db", {"Name": "a"})
+    assert resp.status_code == 200
+    sleep.assert_called_once_with(1)
+
+
+def test_token_bucket_pause_holds_every_worker():
+    bucket = TokenBucket(rate=100)
+    bucket.acquire()
+    bucket.pause(0.2)
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.19
+
+
+def _pages(*pages):
+    """依序回傳查詢結果；每一頁為 (results, next_cursor)。"""
+    bodies = []
+    for results, cursor in pages:
+        bodies.append(_response(200, {"results": results, "has_more": cursor is not None, "next_cursor": cursor}))
+    return bodies
+
+
+@pytest.mark.parametrize("prefetch", [False, True])
+def test_iter_query_follows_cursors(prefetch):
+    api = NotionApi("token")
+    api.query_database = MagicMock(side_effect=_pages(([1, 2], "c1"), ([3], "c2"), ([4, 5], None)))
+
+    assert list(api.iter_query("db", filter={"property": "x"}, page_size=2, prefetch=prefetch)) == [1, 2, 3, 4, 5]
+    bodies = [call.args[1] for call in api.query_database.call_args_list]
+    assert [b.get("start_cursor") for b in bodies] == [None, "c1", "c2"]
+    assert all(b["page_size"] == 2 and b["filter"] == {"property": "x"} for b in bodies)
+
+
+def test_iter_query_prefetches_next_page_while_caller_works():
+    api = NotionApi("token")
+    fetched = threading.Event()
+    pages = _pages(([1], "c1"), ([2], None))
+
+    def query(database_id, body):
+        if body.get("start_cursor"):
+            fetched.set()
+        return pages.pop(0)
+
+    api.query_database = MagicMock(side_effect=query)
+    rows = api.iter_query("db", prefetch=True)
+    assert next(rows) == 1
+    # 呼叫端還在處理第一頁時，第二頁已在背景抓取
+    assert fetched.wait(1)
+    assert list(rows) == [2]
+
+
+def test_iter_query_raises_on_http_error():
+    api = NotionApi("token")
+    failed = _response(400)
+    failed.raise_for_status.side_effect = requests.HTTPError("bad request")
+    api.query_database = MagicMock(side_effect=[*_pages(([1], "c1")), failed])
+    rows = api.iter_query("db")
+    assert next(rows) == 1
+    with pytest.raises(requests.HTTPError):
+        next(rows)
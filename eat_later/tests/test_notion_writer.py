@@ -1,8 +1,10 @@
 import sys, os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
+from unittest.mock import MagicMock
 from extractor import ExtractResult
-from notion_writer import build_properties
+from notion_writer import build_properties, write
+from restaurant_index import IndexedRestaurant, RestaurantIndex
 
 
 def test_build_properties_full():
@@ -56,3 +58,29 @@ def test_build_properties_note_truncated():
     # Notion rich_text 單欄位限 2000 字
     content = props["Note"]["rich_text"][0]["text"]["content"]
     assert len(content) <= 2000
+
+
+def _notion():
+    notion = MagicMock()
+    notion.create_page.return_value = MagicMock(status_code=200, json=lambda: {"id": "new-page"})
+    notion.patch_page.return_value = MagicMock(status_code=200)
+    return notion
+
+
+def test_write_creates_page_and_indexes_it():
+    notion, index = _notion(), RestaurantIndex()
+    assert write(ExtractResult(name="一蘭", url="https://ichiran.example"), notion, index) == "created"
+    assert index.find_url(["https://ichiran.example"]).page_id == "new-page"
+
+
+def test_write_merges_missing_fields_into_existing_row():
+    notion, index = _notion(), RestaurantIndex()
+    index.update(IndexedRestaurant("p1", "一蘭", "https://ichiran.example", types=["拉麵"]))
+    result = ExtractResult(name="一蘭", url="https://ichiran.example", region="台北市", types=["拉麵", "日式"])
+    assert write(result, notion, index) == "merged"
+    notion.create_page.assert_not_called()
+    notion.patch_page.assert_called_once_with("p1", {
+        "地區": {"select": {"name": "台北市"}},
+        "類型": {"multi_select": [{"name": "拉麵"}, {"name": "日式"}]},
+    })
+    assert write(result, notion, index) == "skipped"
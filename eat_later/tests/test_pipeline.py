@@ -0,0 +1,90 @@
+import sys, os
+import threading
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from pipeline import Pipeline, Stage, Watermark
+
+
+def test_pipeline_runs_every_item_through_all_stages():
+    done = []
+    stages = [
+        Stage("double", lambda x: x * 2, workers=3),
+        Stage("inc", lambda x: x + 1, workers=2),
+    ]
+    Pipeline(stages, queue_size=2).run(range(20), on_done=done.append)
+    assert sorted(done) == [x * 2 + 1 for x in range(20)]
+
+
+def test_pipeline_stage_workers_run_concurrently():
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def slow(x):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.05)
+        with lock:
+            active -= 1
+        return x
+
+    Pipeline([Stage("slow", slow, workers=4)]).run(range(8))
+    assert peak == 4
+
+
+def test_pipeline_drops_items_whose_stage_raises():
+    def boom(x):
+        if x == 3:
+            raise RuntimeError("boom")
+        return x
+
+    done = []
+    Pipeline([Stage("boom", boom, workers=2), Stage("id", lambda x: x)]).run(range(5), on_done=done.append)
+    assert sorted(done) == [0, 1, 2, 4]
+
+
+def test_pipeline_keeps_going_when_on_done_raises():
+    done = []
+
+    def record(x):
+        if x % 2:
+            raise OSError("disk full")
+        done.append(x)
+
+    # 只有一個最後階段的 worker、queue 很小：worker 若因 on_done 結束，run() 會卡住
+    pipeline = Pipeline([Stage("id", lambda x: x)], queue_size=1)
+    runner = threading.Thread(target=pipeline.run, args=(range(10), record), daemon=True)
+    runner.start()
+    runner.join(timeout=5)
+    assert not runner.is_alive()
+    assert sorted(done) == [0, 2, 4, 6, 8]
+
+
+def test_watermark_only_advances_over_contiguous_finished_ids():
+    mark = Watermark(["1", "2", "3", "4"], start="0")
+    mark.done("2")
+    assert mark.value == "0"
+    mark.done("1")
+    assert mark.value == "2"
+    mark.done("4")
+    assert mark.value == "2"
+    assert mark.pending == 1
+    mark.done("3")
+    assert mark.value == "4"
+
+
+def test_pipeline_batch_stage_receives_lists():
+    batches = []
+
+    def collect(items):
+        batches.append(list(items))
+        return [x * 10 for x in items]
+
+    done = []
+    Pipeline([Stage("batch", collect, batch_size=4, batch_wait=0.2)]).run(range(10), on_done=done.append)
+    assert sorted(done) == [x * 10 for x in range(10)]
+    assert all(len(b) <= 4 for b in batches)
+    assert len(batches) < 10
@@ -0,0 +1,34 @@
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from progress import ProgressJournal, write_atomic
+
+
+def test_journal_round_trip_and_truncated_tail(tmp_path):
+    path = tmp_path / "progress.jsonl"
+    journal = ProgressJournal(path)
+    journal.record("101", "created")
+    journal.record("103", "error")
+    journal.close()
+    with path.open("a", encoding="utf-8") as f:
+        f.write('{"id": "104", "outc')  # 寫到一半被中斷
+    assert ProgressJournal(path).load() == {"101": "created", "103": "error"}
+
+
+def test_compact_drops_entries_covered_by_state(tmp_path):
+    path = tmp_path / "progress.jsonl"
+    journal = ProgressJournal(path)
+    for msg_id in ("9", "10", "12"):
+        journal.record(msg_id, "created")
+    journal.compact("10")
+    assert journal.load() == {"12": "created"}
+    journal.compact("12")
+    assert not path.exists()
+
+
+def test_write_atomic_replaces_file_without_leftovers(tmp_path):
+    path = tmp_path / "state.json"
+    path.write_text("old", encoding="utf-8")
+    write_atomic(path, "new")
+    assert path.read_text(encoding="utf-8") == "new"
+    assert [p.name for p in tmp_path.iterdir()] == ["state.json"]
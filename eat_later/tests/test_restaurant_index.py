@@ -0,0 +1,57 @@
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from unittest.mock import MagicMock
+from extractor import ExtractResult
+from restaurant_index import IndexedRestaurant, RestaurantIndex, normalize_name
+
+
+def _page(page_id, name, url=None, town=None, types=()):
+    props = {
+        "Name": {"title": [{"plain_text": name}]},
+        "連結": {"url": url},
+        "鄉鎮": {"select": {"name": town} if town else None},
+        "類型": {"multi_select": [{"name": t} for t in types]},
+        "評級": {"number": None},
+    }
+    return {"id": page_id, "properties": props}
+
+
+def _index(*pages):
+    notion = MagicMock()
+    notion.iter_query.return_value = iter(pages)
+    return RestaurantIndex.load(notion, "db")
+
+
+def test_from_page_reads_notion_properties():
+    row = IndexedRestaurant.from_page(_page("p1", "鼎泰豐", "https://dtf.com", "大安區", ["台菜"]))
+    assert row == IndexedRestaurant("p1", "鼎泰豐", "https://dtf.com", None, "大安區", ["台菜"], None)
+
+
+def test_normalize_name_ignores_width_case_and_spacing():
+    assert normalize_name("Ｍｏｓ Burger （信義店）") == normalize_name("mos burger信義店")
+
+
+def test_find_url_matches_normalized_url():
+    index = _index(_page("p1", "鼎泰豐", "https://www.dtf.com/menu?utm_source=ig"))
+    assert index.find_url(["https://WWW.dtf.com/menu#top"]).page_id == "p1"
+    assert index.find_url(["https://other.example"]) is None
+
+
+def test_claim_matches_name_and_town_but_not_name_alone():
+    index = _index(_page("p1", "鼎泰豐", town="大安區"))
+    row, is_new = index.claim(ExtractResult(name="鼎泰豐 ", town="大安區"))
+    assert (row.page_id, is_new) == ("p1", False)
+    _, is_new = index.claim(ExtractResult(name="鼎泰豐", town="信義區"))
+    assert is_new
+    _, is_new = index.claim(ExtractResult(name="鼎泰豐"))
+    assert is_new
+
+
+def test_claim_reserves_new_rows_and_discard_releases_them():
+    index = _index()
+    row, is_new = index.claim(ExtractResult(name="一蘭", url="https://ichiran.example"))
+    assert is_new and row.page_id is None
+    assert index.claim(ExtractResult(name="一蘭", url="https://ichiran.example"))[1] is False
+    index.discard(row)
+    assert index.find_url(["https://ichiran.example"]) is None
@@ -16,6 +16,9 @@ Optional env vars:
     READ_LATER_FEED_LINK   public URL where feed.xml will be served
                            (default: https://tools.paul-learning.dev/read_later/feed.xml)
     READ_LATER_MAX_ITEMS   max items kept in the RSS feed (default: 200)
+    PAGE_CACHE_PATH        SQLite cache of Firecrawl results keyed by normalized
+                           URL, revalidated with conditional GETs (see
+                           common.http_cache)
 """
 
 from __future__ import annotations
@@ -25,25 +28,30 @@ import json
 import os
 import re
 import sys
-import time
 from datetime import datetime, timezone
 from email.utils import format_datetime
 from pathlib import Path
-from urllib.parse import quote, urldefrag, urlparse
+from urllib.parse import urldefrag, urlparse
 
 import requests
 
 BASE_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BASE_DIR.parent))
+
+from common.discord import DiscordClient, ReactionDispatcher  # noqa: E402
+from common.http_cache import CachedPage, PageCache, page_cache_from_env  # noqa: E402
+
 STATE_PATH = BASE_DIR / "state.json"
 FEED_PATH = BASE_DIR / "feed.xml"
 
-DISCORD_API = "https://discord.com/api/v10"
 DEFAULT_FEED_LINK = "https://tools.paul-learning.dev/read_later/feed.xml"
 DEFAULT_MAX_ITEMS = 200
 SUCCESS_REACTION = "✅"
 
 FIRECRAWL_API = "https://api.firecrawl.dev/v2/scrape"
 FIRECRAWL_TOKEN_ENV = "FIRECRAWL_API_KEY"
+# Articles rarely change once published; only revalidate cached scrapes weekly.
+FIRECRAWL_FRESH_FOR = 7 * 24 * 3600
 
 URL_REGEX = re.compile(r"https?://[^\s<>\"'\)\]]+")
 TRAILING_PUNCT = ".,;:!?)]}>"
@@ -69,118 +77,6 @@ def save_state(state: dict) -> None:
         f.write("\n")
 
 
-def discord_get(path: str, token: str, params: dict | None = None) -> list:
-    headers = {"Authorization": f"Bot {token}", "User-Agent": "read-later-bot/1.0"}
-    for attempt in range(5):
-        resp = requests.get(f"{DISCORD_API}{path}", headers=headers, params=params, timeout=30)
-        if resp.status_code == 429:
-            retry_after = float(resp.json().get("retry_after", 1))
-            log(f"  rate limited, sleeping {retry_after}s")
-            time.sleep(retry_after)
-            continue
-        if resp.status_code >= 500:
-            time.sleep(2 ** attempt)
-            continue
-        resp.raise_for_status()
-        return resp.json()
-    raise RuntimeError(f"Discord API failed for {path}")
-
-
-def discord_react(token: str, channel_id: str, message_id: str, emoji: str) -> tuple[bool, str]:
-    """Add a reaction. Returns (success, reason). reason is a short human-readable string on failure."""
-    headers = {"Authorization": f"Bot {token}", "User-Agent": "read-later-bot/1.0"}
-    encoded = quote(emoji, safe="")
-    url = f"{DISCORD_API}/channels/{channel_id}/messages/{message_id}/reactions/{encoded}/@me"
-    last_reason = "未知錯誤"
-    for attempt in range(3):
-        try:
-            resp = requests.put(url, headers=headers, timeout=30)
-        except requests.RequestException as e:
-            last_reason = f"網路錯誤 ({type(e).__name__})"
-            log(f"  reaction error for {message_id}: {last_reason}")
-            time.sleep(2 ** attempt)
-            continue
-        if resp.status_code in (200, 204):
-            return True, ""
-        if resp.status_code == 429:
-            retry_after = float(resp.json().get("retry_after", 1))
-            log(f"  reaction rate limited, sleeping {retry_after}s")
-            time.sleep(retry_after)
-            last_reason = "rate limited"
-            continue
-        if resp.status_code >= 500:
-            last_reason = f"Discord 伺服器錯誤 (HTTP {resp.status_code})"
-            time.sleep(2 ** attempt)
-            continue
-        if resp.status_code == 403:
-            last_reason = "權限不足 (HTTP 403)"
-        elif resp.status_code == 404:
-            last_reason = "訊息已刪除 (HTTP 404)"
-        else:
-            last_reason = f"HTTP {resp.status_code}"
-        log(f"  reaction failed for {message_id}: {last_reason}")
-        return False, last_reason
-    log(f"  reaction gave up for {message_id}: {last_reason}")
-    return False, last_reason
-
-
-def discord_post_message(token: str, channel_id: str, content: str) -> None:
-    headers = {
-        "Authorization": f"Bot {token}",
-        "User-Agent": "read-later-bot/1.0",
-        "Content-Type": "application/json",
-    }
-    try:
-        resp = requests.post(
-            f"{DISCORD_API}/channels/{channel_id}/messages",
-            headers=headers,
-            json={"content": content},
-            timeout=30,
-        )
-        if resp.status_code >= 400:
-            log(f"  post message failed: HTTP {resp.status_code}")
-    except requests.RequestException as e:
-        log(f"  post message error: {type(e).__name__}")
-
-
-def fetch_messages(token: str, channel_id: str, after_id: str | None) -> list[dict]:
-    """Return all messages newer than after_id (or whole history if None), oldest first."""
-    collected: list[dict] = []
-    if after_id:
-        cursor = after_id
-        while True:
-            batch = discord_get(
-                f"/channels/{channel_id}/messages",
-                token,
-                params={"limit": 100, "after": cursor},
-            )
-            if not batch:
-                break
-            # `after` returns newest first; reverse to chronological.
-            batch_sorted = sorted(batch, key=lambda m: int(m["id"]))
-            collected.extend(batch_sorted)
-            cursor = batch_sorted[-1]["id"]
-            if len(batch) < 100:
-                break
-    else:
-        # First run: walk backwards from newest.
-        cursor: str | None = None
-        all_msgs: list[dict] = []
-        while True:
-            params = {"limit": 100}
-            if cursor:
-                params["before"] = cursor
-            batch = discord_get(f"/channels/{channel_id}/messages", token, params=params)
-            if not batch:
-                break
-            all_msgs.extend(batch)
-            cursor = batch[-1]["id"]
-            if len(batch) < 100:
-                break
-        collected = sorted(all_msgs, key=lambda m: int(m["id"]))
-    return collected
-
-
 def normalize_url(url: str) -> str:
     url = url.rstrip(TRAILING_PUNCT)
     url, _ = urldefrag(url)
@@ -280,6 +176,80 @@ def fetch_firecrawl_content(url: str) -> dict | None:
     return out
 
 
+def probe_url(url: str, headers: dict[str, str]) -> tuple[int | None, str | None, str | None]:
+    """GET url without reading the body; returns (status, ETag, Last-Modified).
+
+    Used to revalidate cached scrapes: a 304 means the page is unchanged and
+    the cached Firecrawl result can be reused. status is None on network errors.
+    """
+    try:
+        with requests.get(
+            url,
+            headers={"User-Agent": "read-later-bot/1.0", **headers},
+            timeout=15,
+            stream=True,
+        ) as resp:
+            return resp.status_code, resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+    except requests.RequestException:
+        return None, None, None
+
+
+def _cache_lookup(url: str, cache: PageCache) -> tuple[CachedPage | None, dict | None]:
+    """Read and decode a cached scrape; any cache or decode error counts as a miss."""
+    try:
+        cached = cache.get(url)
+        if cached is None:
+            return None, None
+        return cached, json.loads(cached.content)
+    except Exception as e:
+        log(f"  page cache read failed, ignoring: {type(e).__name__}: {e}")
+        return None, None
+
+
+def cached_firecrawl_content(url: str, cache: PageCache | None) -> dict | None:
+    """fetch_firecrawl_content with an on-disk cache in front of it.
+
+    A fresh cache entry is used without any request. A stale one is
+    revalidated against the original URL; on 304 (or when the origin is
+    unreachable) the cached scrape is kept and no Firecrawl credit is spent.
+    Cache errors never fail the run: reads fall back to a scrape and failed
+    writes are only logged.
+    """
+    if cache is None:
+        return fetch_firecrawl_content(url)
+    cached, cached_content = _cache_lookup(url, cache)
+    if cached and cache.is_fresh(cached):
+        log("  page cache hit")
+        return cached_content
+    status, etag, last_modified = probe_url(url, cached.validators() if cached else {})
+    if cached and status == 304:
+        try:
+            cache.mark_revalidated(url)
+        except Exception as e:
+            log(f"  page cache update failed: {type(e).__name__}: {e}")
+        log("  page cache revalidated (304)")
+        return cached_content
+    if cached and status is None:
+        log("  origin unreachable, keeping cached scrape")
+        return cached_content
+    content = fetch_firecrawl_content(url)
+    if content is not None:
+        try:
+            cache.put(url, json.dumps(content, ensure_ascii=False), etag=etag, last_modified=last_modified)
+        except Exception as e:
+            log(f"  page cache write failed: {type(e).__name__}: {e}")
+    return content
+
+
+def open_page_cache() -> PageCache | None:
+    """page_cache_from_env, but a cache that cannot be opened just disables caching."""
+    try:
+        return page_cache_from_env(fresh_for=FIRECRAWL_FRESH_FOR)
+    except Exception as e:
+        log(f"page cache unavailable, scraping without it: {type(e).__name__}: {e}")
+        return None
+
+
 def message_link(guild_id: str | None, channel_id: str, message_id: str) -> str:
     guild = guild_id or "@me"
     return f"https://discord.com/channels/{guild}/{channel_id}/{message_id}"
@@ -426,8 +396,10 @@ def main() -> int:
     seen_urls: set[str] = set(state.get("seen_urls", []))
     items: list[dict] = list(state.get("items", []))
 
+    discord = DiscordClient(token, user_agent="read-later-bot/1.0", log=lambda msg: log(f"  {msg}"))
+
     log(f"Fetching messages (after={last_id})")
-    messages = fetch_messages(token, channel_id, last_id)
+    messages = discord.fetch_messages(channel_id, last_id)
     log(f"Got {len(messages)} new messages")
 
     new_items: list[dict] = []
@@ -463,13 +435,19 @@ def main() -> int:
 
     if new_items:
         log(f"Scraping {len(new_items)} new URL(s) via Firecrawl")
-        for item in new_items:
-            content = fetch_firecrawl_content(item["url"])
-            if content is None:
-                continue
-            for key in CONTENT_KEYS:
-                if key in content:
-                    item[key] = content[key]
+        page_cache = open_page_cache()
+        try:
+            for item in new_items:
+                content = cached_firecrawl_content(item["url"], page_cache)
+                if content is None:
+                    continue
+                for key in CONTENT_KEYS:
+                    if key in content:
+                        item[key] = content[key]
+        finally:
+            if page_cache:
+                log(page_cache.summary())
+                page_cache.close()
         items.extend(new_items)
 
     items.sort(key=lambda i: i["shared_at"], reverse=True)
@@ -484,19 +462,13 @@ def main() -> int:
     FEED_PATH.write_text(feed_xml, encoding="utf-8")
     log(f"Wrote {FEED_PATH} with {len(items)} items ({len(new_items)} new)")
 
-    reacted: set[str] = set()
-    for item in new_items:
-        msg_id = item.get("message_id")
-        if not msg_id or msg_id in reacted:
-            continue
-        reacted.add(msg_id)
-        ok, reason = discord_react(token, channel_id, msg_id, SUCCESS_REACTION)
-        if not ok:
-            discord_post_message(
-                token,
-                channel_id,
-                f"⚠️ 無法對訊息加 {SUCCESS_REACTION} reaction（訊息 ID: {msg_id}）：{reason}",
-            )
+    with ReactionDispatcher(discord, channel_id) as reactions:
+        for item in new_items:
+            if item.get("message_id"):
+                reactions.submit(item["message_id"], SUCCESS_REACTION)
+    if reactions.failures:
+        log(f"{len(reactions.failures)} reaction(s) failed, posting summary")
+        reactions.post_summary()
 
     return 0
 
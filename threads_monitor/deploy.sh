@@ -11,7 +11,7 @@ fi
 VPS=root@$VPS_HOST
 
 echo "==> 同步程式碼到 VPS..."
-rsync -av --exclude='.venv' --exclude='__pycache__' --exclude='*.pyc' \
+rsync -av --exclude='.venv' --exclude='__pycache__' --exclude='*.pyc' --exclude='*.db' \
   threads_monitor/ $VPS:/opt/threads_monitor/
 rsync -av --exclude='__pycache__' --exclude='*.pyc' \
   common/ $VPS:/opt/threads_monitor/common/
@@ -1,30 +1,38 @@
+import argparse
+import asyncio
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
 from common.gemini import GeminiClient
+from common.llm_metrics import MetricsAggregator
 from common.notion import NotionApi
 from notifier import DiscordNotifier
-from scraper import ThreadPost, search_threads
+from scraper import AsyncThreadsScraper, ThreadPost, ThreadsScraper
+from seen_cache import SeenPostCache
+from translation_cache import TranslationCache
 from translator import Translator, is_chinese
 
 KEYWORDS_DB_ID = "37e8303f78f7807196e8dfa2bfdeb96e"
 SEEN_POSTS_DB_ID = "37e8303f78f780d79770e6cd32c881f4"
 
+# 本次執行所有 LLM 呼叫的量測，結束時印出摘要
+LLM_METRICS = MetricsAggregator()
+
+# 同時載入搜尋頁的分頁數（async 模式下為同時搜尋的關鍵字數）
+SCRAPER_PAGES = 3
+
 
 def fetch_active_keywords(notion: NotionApi) -> list[tuple[str, str]]:
-    resp = notion.query_database(KEYWORDS_DB_ID, {
-        "filter": {
-            "property": "Active",
-            "checkbox": {"equals": True}
-        }
-    })
-    resp.raise_for_status()
     results = []
-    for page in resp.json()["results"]:
+    for page in notion.iter_query(KEYWORDS_DB_ID, {
+        "property": "Active",
+        "checkbox": {"equals": True}
+    }):
         props = page["properties"]
         title_parts = props.get("Keyword", {}).get("title", [])
         keyword = title_parts[0]["plain_text"] if title_parts else None
@@ -34,28 +42,17 @@ def fetch_active_keywords(notion: NotionApi) -> list[tuple[str, str]]:
     return results
 
 
-def fetch_seen_post_ids(notion: NotionApi) -> set[str]:
-    seen: set[str] = set()
-    cursor = None
-    while True:
-        body: dict = {"page_size": 100}
-        if cursor:
-            body["start_cursor"] = cursor
-        resp = notion.query_database(SEEN_POSTS_DB_ID, body)
-        resp.raise_for_status()
-        data = resp.json()
-        for page in data["results"]:
-            title_parts = page["properties"].get("Post ID", {}).get("title", [])
-            if title_parts:
-                seen.add(title_parts[0]["plain_text"])
-        if not data.get("has_more"):
-            break
-        cursor = data.get("next_cursor")
-    return seen
-
-
-def record_seen_post(notion: NotionApi, keyword: str, post: ThreadPost) -> None:
-    props = {
+def fetch_seen_post_ids(notion: NotionApi, since: str | None = None):
+    """逐筆 yield SEEN_POSTS 的 Post ID；給 since 時只取該時間之後建立的列。"""
+    post_filter = {"timestamp": "created_time", "created_time": {"on_or_after": since}} if since else None
+    for page in notion.iter_query(SEEN_POSTS_DB_ID, post_filter, prefetch=True):
+        title_parts = page["properties"].get("Post ID", {}).get("title", [])
+        if title_parts:
+            yield title_parts[0]["plain_text"]
+
+
+def _seen_post_properties(keyword: str, post: ThreadPost) -> dict:
+    return {
         "Post ID": {"title": [{"text": {"content": post.post_id}}]},
         "Keyword": {"rich_text": [{"text": {"content": keyword}}]},
         "Author": {"rich_text": [{"text": {"content": post.author}}]},
@@ -63,32 +60,92 @@ def record_seen_post(notion: NotionApi, keyword: str, post: ThreadPost) -> None:
         "URL": {"url": post.url},
         "Notified At": {"date": {"start": datetime.now(timezone.utc).isoformat()}},
     }
-    resp = notion.create_page(SEEN_POSTS_DB_ID, props)
-    resp.raise_for_status()
+
+
+def record_seen_posts(notion: NotionApi, keyword: str, posts: list[ThreadPost]) -> list[ThreadPost]:
+    """批次寫入已通知貼文，回傳成功寫入的貼文。"""
+    results = notion.bulk_create_pages(
+        SEEN_POSTS_DB_ID, [_seen_post_properties(keyword, post) for post in posts]
+    )
+    recorded = []
+    for post, result in zip(posts, results):
+        if result.ok:
+            recorded.append(post)
+        else:
+            reason = result.error or f"HTTP {result.response.status_code}: {result.response.text[:200]}"
+            print(f"  Record error for {post.post_id}: {reason}", file=sys.stderr)
+    return recorded
 
 
 def build_translator() -> Translator | None:
     if not os.environ.get("GOOGLE_API_KEY"):
         print("Warning: GOOGLE_API_KEY not set, translation disabled.", file=sys.stderr)
         return None
-    return Translator(GeminiClient(model_name="flash"))
+    return Translator(GeminiClient(model_name="flash", hooks=[LLM_METRICS]), cache=TranslationCache())
 
 
-def translate_if_needed(translator: Translator | None, post: ThreadPost) -> str | None:
-    if translator is None or not post.content or is_chinese(post.content):
-        return None
+def finish(seen_cache: SeenPostCache, translator: Translator | None) -> None:
+    seen_cache.close()
+    if translator is not None and translator.cache is not None:
+        print(translator.cache.summary())
+        translator.cache.close()
+    if translator is not None:
+        LLM_METRICS.report("threads_monitor")
+
+
+def translate_posts(translator: Translator | None, posts: list[ThreadPost]) -> dict[str, str]:
+    """批次翻譯非中文貼文，回傳 post_id → 譯文（翻譯失敗的不會出現；整批失敗時回傳空 dict）。"""
+    if translator is None:
+        return {}
+    targets = [post for post in posts if post.content and not is_chinese(post.content)]
+    if not targets:
+        return {}
     try:
-        return translator.translate_to_chinese(post.content)
+        translations = translator.translate_batch([post.content for post in targets])
     except Exception as e:
-        print(f"  Translate error for {post.post_id}: {e}", file=sys.stderr)
-        return None
+        # 翻譯失敗時照常通知，只是不附譯文
+        print(f"  Translate error for {len(targets)} post(s): {e}", file=sys.stderr)
+        return {}
+    return {post.post_id: text for post, text in zip(targets, translations) if text}
+
+
+def process_keyword(
+    notion: NotionApi,
+    seen_cache: SeenPostCache,
+    seen_ids: set[str],
+    translator: Translator | None,
+    keyword: str,
+    webhook_url: str,
+    posts: list[ThreadPost],
+) -> None:
+    notifier = DiscordNotifier(webhook_url)
+    new_posts = [post for post in posts if post.post_id not in seen_ids]
+    translations = translate_posts(translator, new_posts)
+    notified: list[ThreadPost] = []
+    for post in new_posts:
+        if post.post_id in seen_ids:
+            continue
+        try:
+            notifier.notify(keyword, post, translations.get(post.post_id))
+            seen_ids.add(post.post_id)
+            notified.append(post)
+        except Exception as e:
+            print(f"  Notify error for {post.post_id}: {e}", file=sys.stderr)
 
+    new_count = len(notified)
+    if notified:
+        recorded = record_seen_posts(notion, keyword, notified)
+        seen_cache.add_many(post.post_id for post in recorded)
 
-def main() -> None:
+    print(f"  → {new_count} new post(s) notified.")
+
+
+def prepare() -> tuple[NotionApi, list[tuple[str, str]], SeenPostCache, set[str], Translator | None] | None:
+    """共用的啟動流程；不需執行（安靜時段、沒有關鍵字）時回傳 None。"""
     hour = datetime.now(ZoneInfo("Asia/Taipei")).hour
     if 0 <= hour < 10:
         print(f"Quiet hours (TW 00:00–10:00), skipping. Current hour: {hour:02d}:xx")
-        return
+        return None
 
     notion_secret = os.environ.get("NOTION_SECRET")
     if not notion_secret:
@@ -100,38 +157,66 @@ def main() -> None:
     keywords = fetch_active_keywords(notion)
     if not keywords:
         print("No active keywords found.")
-        return
+        return None
     print(f"Found {len(keywords)} active keyword(s).")
 
-    seen_ids = fetch_seen_post_ids(notion)
-    print(f"Loaded {len(seen_ids)} seen post IDs from Notion.")
+    seen_cache = SeenPostCache()
+    pulled = seen_cache.sync(lambda since: fetch_seen_post_ids(notion, since))
+    seen_ids = seen_cache.ids()
+    print(f"Loaded {len(seen_ids)} seen post IDs ({pulled} pulled from Notion).")
 
-    translator = build_translator()
+    return notion, keywords, seen_cache, seen_ids, build_translator()
 
-    for keyword, webhook_url in keywords:
-        print(f"Searching: {keyword}")
-        try:
-            posts = search_threads(keyword)
-        except Exception as e:
-            print(f"  Scrape error: {e}", file=sys.stderr)
-            continue
 
-        notifier = DiscordNotifier(webhook_url)
-        new_count = 0
-        for post in posts:
-            if post.post_id in seen_ids:
-                continue
-            translation = translate_if_needed(translator, post)
-            try:
-                notifier.notify(keyword, post, translation)
-                record_seen_post(notion, keyword, post)
-                seen_ids.add(post.post_id)
-                new_count += 1
-            except Exception as e:
-                print(f"  Notify/record error for {post.post_id}: {e}", file=sys.stderr)
+def main() -> None:
+    prepared = prepare()
+    if prepared is None:
+        return
+    notion, keywords, seen_cache, seen_ids, translator = prepared
+
+    with ThreadsScraper(max_pages=SCRAPER_PAGES, capture_json=True) as scraper:
+        results = scraper.search_many(keyword for keyword, _ in keywords)
+        for (keyword, webhook_url), (_, posts) in zip(keywords, results):
+            print(f"Searching: {keyword}")
+            process_keyword(notion, seen_cache, seen_ids, translator, keyword, webhook_url, posts)
 
-        print(f"  → {new_count} new post(s) notified.")
+    finish(seen_cache, translator)
 
 
+async def amain() -> None:
+    """async 模式：關鍵字並行搜尋，先完成的關鍵字立即開始翻譯與通知。
+
+    通知在單一背景執行緒依序執行，seen_ids 與 SeenPostCache 不會被同時存取，
+    跨關鍵字重複出現的貼文也只會通知一次。
+    """
+    prepared = prepare()
+    if prepared is None:
+        return
+    notion, keywords, seen_cache, seen_ids, translator = prepared
+
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=1) as notify_pool:
+        pending = []
+        async with AsyncThreadsScraper(concurrency=SCRAPER_PAGES, capture_json=True) as scraper:
+            async for index, posts in scraper.search_many(keyword for keyword, _ in keywords):
+                keyword, webhook_url = keywords[index]
+                print(f"Searched: {keyword} ({len(posts)} post(s))")
+                pending.append(loop.run_in_executor(
+                    notify_pool, process_keyword,
+                    notion, seen_cache, seen_ids, translator, keyword, webhook_url, posts,
+                ))
+        await asyncio.gather(*pending)
+
+    finish(seen_cache, translator)
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Notify new Threads posts for active keywords.")
+    parser.add_argument(
+        "--async", dest="use_async", action="store_true",
+        help="Search keywords concurrently with playwright.async_api and notify as results arrive.",
+    )
+    args = parser.parse_args()
+    if args.use_async:
+        asyncio.run(amain())
+    else:
+        main()
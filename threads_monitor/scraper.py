@@ -1,10 +1,70 @@
-import re
+import asyncio
+import json
 import sys
 from dataclasses import dataclass
+from urllib.parse import urlparse
+from typing import AsyncIterator, Iterable, Iterator
 
+from playwright.async_api import async_playwright
 from playwright.sync_api import sync_playwright
 
 BASE_URL = "https://www.threads.net"
+USER_AGENT = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/124.0.0.0 Safari/537.36"
+)
+POST_SELECTOR = "a[href*='/post/']"
+CONTENT_LIMIT = 500
+
+# block_resources=True 時攔截的請求：圖片/影音/字型，以及非 Threads/Meta 網域的任何資源
+_BLOCKED_RESOURCE_TYPES = {"image", "media", "font"}
+_FIRST_PARTY_HOSTS = ("threads.net", "threads.com", "cdninstagram.com", "fbcdn.net", "instagram.com")
+
+# 頁面內嵌的初始資料（SSR）通常放在 <script type="application/json">
+_EMBEDDED_JSON_JS = """
+    () => Array.from(document.querySelectorAll('script[type="application/json"]'))
+        .map(s => s.textContent)
+        .filter(t => t && t.includes('"caption"'))
+"""
+
+# Extract post data via JS to avoid repeated Python↔browser round-trips
+_EXTRACT_POSTS_JS = """
+    ([maxResults, maxContent]) => {
+        const seen = new Set();
+        const results = [];
+        const links = document.querySelectorAll('a[href*="/post/"]');
+
+        for (const link of links) {
+            if (results.length >= maxResults) break;
+
+            const href = link.getAttribute('href');
+            const match = href && href.match(/\\/@([^\\/]+)\\/post\\/([^\\/?#]+)/);
+            if (!match) continue;
+
+            const postId = match[2];
+            if (seen.has(postId)) continue;
+            seen.add(postId);
+
+            // Walk up to the article/post container for content
+            let container = link;
+            for (let i = 0; i < 8; i++) {
+                const parent = container.parentElement;
+                if (!parent) break;
+                container = parent;
+                if (container.tagName === 'ARTICLE') break;
+            }
+
+            results.push({
+                href: href,
+                author: match[1],
+                post_id: postId,
+                content: (container.innerText || '').trim().substring(0, maxContent),
+            });
+        }
+        return results;
+    }
+"""
 
 
 @dataclass
@@ -15,69 +75,66 @@ class ThreadPost:
     url: str
 
 
-def search_threads(keyword: str, max_results: int = 20) -> list[ThreadPost]:
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context(
-            user_agent=(
-                "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/124.0.0.0 Safari/537.36"
-            ),
-            locale="zh-TW",
-        )
-        page = context.new_page()
-
-        search_url = f"{BASE_URL}/search?q={keyword}&serp_type=default"
-        page.goto(search_url, wait_until="domcontentloaded")
+def _search_url(keyword: str) -> str:
+    return f"{BASE_URL}/search?q={keyword}&serp_type=default"
+
+
+def _should_block(resource_type: str, url: str) -> bool:
+    if resource_type in _BLOCKED_RESOURCE_TYPES:
+        return True
+    host = urlparse(url).hostname or ""
+    first_party = any(host == h or host.endswith("." + h) for h in _FIRST_PARTY_HOSTS)
+    return not first_party and resource_type != "document"
 
-        try:
-            page.wait_for_selector("a[href*='/post/']", timeout=15000)
-        except Exception:
-            print(f"  No posts found for '{keyword}'", file=sys.stderr)
-            browser.close()
-            return []
 
-        # Extract post data via JS to avoid repeated Python↔browser round-trips
-        raw_posts: list[dict] = page.evaluate("""
-            (maxResults) => {
-                const seen = new Set();
-                const results = [];
-                const links = document.querySelectorAll('a[href*="/post/"]');
-
-                for (const link of links) {
-                    if (results.length >= maxResults) break;
-
-                    const href = link.getAttribute('href');
-                    const match = href && href.match(/\\/@([^\\/]+)\\/post\\/([^\\/?#]+)/);
-                    if (!match) continue;
-
-                    const postId = match[2];
-                    if (seen.has(postId)) continue;
-                    seen.add(postId);
-
-                    // Walk up to the article/post container for content
-                    let container = link;
-                    for (let i = 0; i < 8; i++) {
-                        const parent = container.parentElement;
-                        if (!parent) break;
-                        container = parent;
-                        if (container.tagName === 'ARTICLE') break;
-                    }
-
-                    results.push({
-                        href: href,
-                        author: match[1],
-                        post_id: postId,
-                        content: (container.innerText || '').trim().substring(0, 500),
-                    });
+def _is_data_response(response) -> bool:
+    if response.request.resource_type not in ("xhr", "fetch"):
+        return False
+    if "graphql" not in response.url and "/api/" not in response.url:
+        return False
+    return "json" in (response.headers.get("content-type") or "")
+
+
+def _walk_posts(node, found: dict[str, dict]) -> None:
+    """在 GraphQL / 內嵌 JSON 裡找貼文物件：有 code、user.username 與 caption 欄位的 dict。"""
+    if isinstance(node, dict):
+        user = node.get("user")
+        code = node.get("code")
+        if isinstance(code, str) and isinstance(user, dict) and user.get("username") and "caption" in node:
+            if code not in found:
+                caption = node.get("caption") or {}
+                text = caption.get("text", "") if isinstance(caption, dict) else ""
+                found[code] = {
+                    "href": f"/@{user['username']}/post/{code}",
+                    "author": user["username"],
+                    "post_id": code,
+                    "content": text.strip()[:CONTENT_LIMIT],
                 }
-                return results;
-            }
-        """, max_results)
+        for value in node.values():
+            _walk_posts(value, found)
+    elif isinstance(node, list):
+        for value in node:
+            _walk_posts(value, found)
+
+
+def _posts_from_json(documents: list, max_results: int) -> list[dict]:
+    found: dict[str, dict] = {}
+    for doc in documents:
+        _walk_posts(doc, found)
+    return list(found.values())[:max_results]
+
+
+def _parse_json_texts(texts: list[str]) -> list:
+    documents = []
+    for text in texts:
+        try:
+            documents.append(json.loads(text))
+        except ValueError:
+            continue
+    return documents
 
-        browser.close()
 
+def _to_posts(raw_posts: list[dict]) -> list[ThreadPost]:
     posts = []
     for item in raw_posts:
         posts.append(ThreadPost(
@@ -87,3 +144,228 @@ def search_threads(keyword: str, max_results: int = 20) -> list[ThreadPost]:
             url=BASE_URL + item["href"],
         ))
     return posts
+
+
+class ThreadsScraper:
+    """一次執行只啟動一個 Chromium，重複使用同一個 context 與最多 max_pages 個分頁。
+
+    search_many() 先在每個分頁發出導覽（只等到 commit），再逐一等待結果，
+    讓多個關鍵字的搜尋頁在瀏覽器裡同時載入。
+
+    block_resources: 攔截圖片、影音、字型與第三方資源，減少頻寬與載入時間。
+    capture_json: 從頁面抓取的 GraphQL 回應與內嵌 JSON 解析貼文，取得乾淨的內文；
+        解析不到時退回 DOM 擷取。
+    """
+
+    def __init__(
+        self,
+        max_pages: int = 3,
+        timeout_ms: int = 15000,
+        block_resources: bool = True,
+        capture_json: bool = False,
+    ) -> None:
+        self.max_pages = max(1, max_pages)
+        self.timeout_ms = timeout_ms
+        self.block_resources = block_resources
+        self.capture_json = capture_json
+        self._playwright = None
+        self._browser = None
+        self._context = None
+        self._pages = []
+        self._responses: list[list] = []
+
+    def __enter__(self) -> "ThreadsScraper":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def start(self) -> None:
+        self._playwright = sync_playwright().start()
+        self._browser = self._playwright.chromium.launch(headless=True)
+        self._context = self._browser.new_context(user_agent=USER_AGENT, locale="zh-TW")
+        if self.block_resources:
+            self._context.route("**/*", self._route)
+
+    @staticmethod
+    def _route(route) -> None:
+        if _should_block(route.request.resource_type, route.request.url):
+            route.abort()
+        else:
+            route.continue_()
+
+    def close(self) -> None:
+        if self._browser is not None:
+            self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            self._playwright.stop()
+            self._playwright = None
+        self._context = None
+        self._pages = []
+        self._responses = []
+
+    def search(self, keyword: str, max_results: int = 20) -> list[ThreadPost]:
+        for _, posts in self.search_many([keyword], max_results):
+            return posts
+        return []
+
+    def search_many(
+        self, keywords: Iterable[str], max_results: int = 20
+    ) -> Iterator[tuple[str, list[ThreadPost]]]:
+        """依輸入順序 yield (keyword, posts)；單一關鍵字失敗時印出錯誤並回傳空列表。"""
+        keywords = list(keywords)
+        for start in range(0, len(keywords), self.max_pages):
+            batch = keywords[start:start + self.max_pages]
+            pages = self._ensure_pages(len(batch))
+
+            navigated = []
+            for i, (page, keyword) in enumerate(zip(pages, batch)):
+                self._responses[i].clear()
+                try:
+                    page.goto(_search_url(keyword), wait_until="commit")
+                    navigated.append(True)
+                except Exception as e:
+                    print(f"  Scrape error for '{keyword}': {e}", file=sys.stderr)
+                    navigated.append(False)
+
+            for i, (page, keyword, ok) in enumerate(zip(pages, batch, navigated)):
+                yield keyword, self._collect(page, self._responses[i], keyword, max_results) if ok else []
+
+    def _ensure_pages(self, count: int) -> list:
+        while len(self._pages) < count:
+            page = self._context.new_page()
+            responses: list = []
+            if self.capture_json:
+                page.on("response", lambda r, bucket=responses: bucket.append(r) if _is_data_response(r) else None)
+            self._pages.append(page)
+            self._responses.append(responses)
+        return self._pages[:count]
+
+    def _collect(self, page, responses: list, keyword: str, max_results: int) -> list[ThreadPost]:
+        try:
+            page.wait_for_selector(POST_SELECTOR, timeout=self.timeout_ms)
+        except Exception:
+            print(f"  No posts found for '{keyword}'", file=sys.stderr)
+            return []
+        try:
+            if self.capture_json:
+                texts = page.evaluate(_EMBEDDED_JSON_JS)
+                for response in responses:
+                    try:
+                        texts.append(response.text())
+                    except Exception:
+                        continue
+                raw_posts = _posts_from_json(_parse_json_texts(texts), max_results)
+                if raw_posts:
+                    return _to_posts(raw_posts)
+            return _to_posts(page.evaluate(_EXTRACT_POSTS_JS, [max_results, CONTENT_LIMIT]))
+        except Exception as e:
+            print(f"  Scrape error for '{keyword}': {e}", file=sys.stderr)
+            return []
+
+
+class AsyncThreadsScraper:
+    """ThreadsScraper 的 asyncio 版本：共用一個瀏覽器，以 semaphore 限制同時搜尋的分頁數。
+
+    search_many() 依完成順序 yield，呼叫端可以在其他關鍵字還在載入時先處理已完成的結果。
+    block_resources / capture_json 同 ThreadsScraper。
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 3,
+        timeout_ms: int = 15000,
+        block_resources: bool = True,
+        capture_json: bool = False,
+    ) -> None:
+        self.concurrency = max(1, concurrency)
+        self.timeout_ms = timeout_ms
+        self.block_resources = block_resources
+        self.capture_json = capture_json
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._playwright = None
+        self._browser = None
+        self._context = None
+
+    async def __aenter__(self) -> "AsyncThreadsScraper":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(headless=True)
+        self._context = await self._browser.new_context(user_agent=USER_AGENT, locale="zh-TW")
+        if self.block_resources:
+            await self._context.route("**/*", self._route)
+
+    @staticmethod
+    async def _route(route) -> None:
+        if _should_block(route.request.resource_type, route.request.url):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def close(self) -> None:
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+        self._context = None
+
+    async def search(self, keyword: str, max_results: int = 20) -> list[ThreadPost]:
+        """單一關鍵字失敗時印出錯誤並回傳空列表。"""
+        async with self._semaphore:
+            page = await self._context.new_page()
+            responses: list = []
+            if self.capture_json:
+                page.on("response", lambda r: responses.append(r) if _is_data_response(r) else None)
+            try:
+                await page.goto(_search_url(keyword), wait_until="domcontentloaded")
+                try:
+                    await page.wait_for_selector(POST_SELECTOR, timeout=self.timeout_ms)
+                except Exception:
+                    print(f"  No posts found for '{keyword}'", file=sys.stderr)
+                    return []
+                if self.capture_json:
+                    texts = await page.evaluate(_EMBEDDED_JSON_JS)
+                    for response in responses:
+                        try:
+                            texts.append(await response.text())
+                        except Exception:
+                            continue
+                    raw_posts = _posts_from_json(_parse_json_texts(texts), max_results)
+                    if raw_posts:
+                        return _to_posts(raw_posts)
+                return _to_posts(await page.evaluate(_EXTRACT_POSTS_JS, [max_results, CONTENT_LIMIT]))
+            except Exception as e:
+                print(f"  Scrape error for '{keyword}': {e}", file=sys.stderr)
+                return []
+            finally:
+                await page.close()
+
+    async def search_many(
+        self, keywords: Iterable[str], max_results: int = 20
+    ) -> AsyncIterator[tuple[int, list[ThreadPost]]]:
+        """依完成順序 yield (輸入索引, posts)。"""
+        async def run(index: int, keyword: str) -> tuple[int, list[ThreadPost]]:
+            return index, await self.search(keyword, max_results)
+
+        tasks = [asyncio.create_task(run(i, keyword)) for i, keyword in enumerate(keywords)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def search_threads(keyword: str, max_results: int = 20) -> list[ThreadPost]:
+    with ThreadsScraper(max_pages=1) as scraper:
+        return scraper.search(keyword, max_results)
@@ -0,0 +1,90 @@
+"""本機 SQLite 快取 SEEN_POSTS 資料庫的 Post ID，每次執行只向 Notion 拉新增的列。
+
+同步水位（last_sync）存在同一個檔案裡；沒有水位、距上次完整同步超過
+FULL_RESYNC_INTERVAL，或增量同步失敗時，退回完整重抓並以結果取代本機內容。
+"""
+
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Iterable
+
+DEFAULT_PATH = Path(__file__).resolve().parent / "seen_posts.db"
+
+# Notion 的 created_time 只精確到分鐘，且本機與 Notion 時鐘可能有偏差，
+# 水位往回退一點，多抓到的列會被 INSERT OR IGNORE 吸收
+SYNC_OVERLAP = timedelta(minutes=5)
+FULL_RESYNC_INTERVAL = timedelta(days=7)
+
+# fetch(since) 回傳 Post ID；since 為 None 表示要全部
+FetchIds = Callable[[str | None], Iterable[str]]
+
+
+class SeenPostCache:
+    def __init__(self, path: Path | str = DEFAULT_PATH) -> None:
+        # monitor 的 async 模式會在單一背景執行緒使用此連線（不會同時存取）
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS seen_posts (post_id TEXT PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            """
+        )
+
+    def __enter__(self) -> "SeenPostCache":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def ids(self) -> set[str]:
+        return {row[0] for row in self.conn.execute("SELECT post_id FROM seen_posts")}
+
+    def add_many(self, post_ids: Iterable[str]) -> None:
+        with self.conn:
+            self._insert(post_ids)
+
+    def sync(self, fetch: FetchIds, full: bool = False) -> int:
+        """與 Notion 同步，回傳這次從 Notion 拉到的列數。"""
+        now = datetime.now(timezone.utc)
+        last_sync = self._get_time("last_sync")
+        last_full = self._get_time("last_full_sync")
+        if full or last_sync is None or last_full is None or now - last_full > FULL_RESYNC_INTERVAL:
+            return self._full_sync(fetch, now)
+
+        since = (last_sync - SYNC_OVERLAP).isoformat()
+        try:
+            post_ids = list(fetch(since))
+        except Exception:
+            return self._full_sync(fetch, now)
+        with self.conn:
+            self._insert(post_ids)
+            self._set_time("last_sync", now)
+        return len(post_ids)
+
+    def _full_sync(self, fetch: FetchIds, now: datetime) -> int:
+        post_ids = list(fetch(None))
+        with self.conn:
+            self.conn.execute("DELETE FROM seen_posts")
+            self._insert(post_ids)
+            self._set_time("last_sync", now)
+            self._set_time("last_full_sync", now)
+        return len(post_ids)
+
+    def _insert(self, post_ids: Iterable[str]) -> None:
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO seen_posts (post_id) VALUES (?)",
+            ((post_id,) for post_id in post_ids),
+        )
+
+    def _get_time(self, key: str) -> datetime | None:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def _set_time(self, key: str, value: datetime) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value.isoformat())
+        )
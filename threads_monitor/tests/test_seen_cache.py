@@ -0,0 +1,67 @@
+import sys, os
+from datetime import datetime, timedelta, timezone
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from unittest.mock import MagicMock
+from seen_cache import FULL_RESYNC_INTERVAL, SYNC_OVERLAP, SeenPostCache
+
+
+def test_first_sync_fetches_everything():
+    cache = SeenPostCache(":memory:")
+    fetch = MagicMock(return_value=["a", "b"])
+    assert cache.sync(fetch) == 2
+    fetch.assert_called_once_with(None)
+    assert cache.ids() == {"a", "b"}
+
+
+def test_later_sync_only_fetches_rows_since_last_sync():
+    cache = SeenPostCache(":memory:")
+    cache.sync(MagicMock(return_value=["a", "b"]))
+    last_sync = cache._get_time("last_sync")
+
+    fetch = MagicMock(return_value=["b", "c"])
+    assert cache.sync(fetch) == 2
+    fetch.assert_called_once_with((last_sync - SYNC_OVERLAP).isoformat())
+    assert cache.ids() == {"a", "b", "c"}
+
+
+def test_failed_incremental_sync_falls_back_to_full_resync():
+    cache = SeenPostCache(":memory:")
+    cache.sync(MagicMock(return_value=["a", "stale"]))
+
+    def fetch(since):
+        if since is not None:
+            raise RuntimeError("notion down")
+        return ["a", "c"]
+
+    assert cache.sync(fetch) == 2
+    assert cache.ids() == {"a", "c"}
+
+
+def test_full_resync_when_last_full_sync_is_old_or_forced():
+    cache = SeenPostCache(":memory:")
+    cache.sync(MagicMock(return_value=["a"]))
+    with cache.conn:
+        cache._set_time("last_full_sync", datetime.now(timezone.utc) - FULL_RESYNC_INTERVAL - timedelta(hours=1))
+
+    fetch = MagicMock(return_value=["b"])
+    cache.sync(fetch)
+    fetch.assert_called_once_with(None)
+    assert cache.ids() == {"b"}
+
+    fetch = MagicMock(return_value=["c"])
+    cache.sync(fetch, full=True)
+    fetch.assert_called_once_with(None)
+    assert cache.ids() == {"c"}
+
+
+def test_sync_state_survives_reopening(tmp_path):
+    path = tmp_path / "seen.db"
+    with SeenPostCache(path) as cache:
+        cache.sync(MagicMock(return_value=["a"]))
+        cache.add_many(["b"])
+    with SeenPostCache(path) as cache:
+        fetch = MagicMock(return_value=[])
+        cache.sync(fetch)
+        assert fetch.call_args.args[0] is not None
+        assert cache.ids() == {"a", "b"}
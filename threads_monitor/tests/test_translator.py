@@ -0,0 +1,62 @@
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from unittest.mock import MagicMock
+from translation_cache import TranslationCache
+from translator import Translator, parse_batch_reply, split_batches
+
+
+def test_split_batches_respects_token_budget_and_item_limit():
+    texts = ["a" * 400, "b" * 400, "c" * 400, "d"]  # 各約 101 / 101 / 101 / 1 token
+    assert split_batches(texts, token_budget=250, max_items=20) == [[0, 1], [2, 3]]
+    assert split_batches(texts, token_budget=10_000, max_items=3) == [[0, 1, 2], [3]]
+
+
+def test_split_batches_puts_oversized_text_in_its_own_batch():
+    assert split_batches(["短", "x" * 4000, "短"], token_budget=100) == [[0], [1], [2]]
+
+
+def test_parse_batch_reply_skips_missing_empty_and_mismatched_items():
+    reply = (
+        "<<<1>>>\n第一則\n<<<END 1>>>\n"
+        "<<<2>>>\n\n<<<END 2>>>\n"
+        "<<<3>>>\n第三則\n<<<END 4>>>\n"
+        "<<<5>>> 第五則 <<<END 5>>>"
+    )
+    assert parse_batch_reply(reply) == {1: "第一則", 5: "第五則"}
+
+
+def _gemini(batch_reply: str | Exception, fallback: list):
+    gemini = MagicMock(use_cli=False, model_name="flash")
+    if isinstance(batch_reply, Exception):
+        gemini.generate.side_effect = batch_reply
+    else:
+        gemini.generate.return_value = batch_reply
+    gemini.generate_many.return_value = fallback
+    return gemini
+
+
+def test_translate_batch_retries_only_unparsed_items_individually():
+    gemini = _gemini("<<<1>>>\n一\n<<<END 1>>>\n<<<3>>>\n三\n<<<END 3>>>", ["二"])
+    assert Translator(gemini).translate_batch(["one", "two", "three"]) == ["一", "二", "三"]
+
+    gemini.generate.assert_called_once()
+    prompts = gemini.generate_many.call_args.args[0]
+    assert len(prompts) == 1 and prompts[0].endswith("two")
+
+
+def test_translate_batch_falls_back_per_item_when_batch_call_fails():
+    gemini = _gemini(RuntimeError("quota"), ["一", RuntimeError("still down")])
+    assert Translator(gemini).translate_batch(["one", "two"]) == ["一", None]
+    assert len(gemini.generate_many.call_args.args[0]) == 2
+
+
+def test_translate_batch_skips_cached_texts_and_caches_new_ones():
+    cache = TranslationCache(":memory:")
+    gemini = _gemini("", ["二"])
+    translator = Translator(gemini, cache=cache)
+    cache.put("one", "zh-TW", translator.model, "一")
+
+    assert translator.translate_batch(["one", "two"]) == ["一", "二"]
+    gemini.generate.assert_not_called()  # 只剩一則，不必組批次
+    assert cache.get("two", "zh-TW", translator.model) == "二"
@@ -0,0 +1,63 @@
+"""跨執行共用的翻譯快取（SQLite），key 為正規化內文 + 目標語言 + 模型的 hash。
+
+同一則爆紅貼文常在多個關鍵字、多次執行中重複出現，命中快取就不必再呼叫 LLM。
+超過 TTL 的項目視為未命中；筆數超過 max_entries 時依最近使用時間淘汰（LRU，見 common.sqlite_store）。
+"""
+
+import hashlib
+import os
+import re
+import sys
+import unicodedata
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from common.sqlite_store import SqliteLruStore
+
+DEFAULT_PATH = Path(__file__).resolve().parent / "translation_cache.db"
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_TTL = 30 * 24 * 3600
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def cache_key(text: str, target_lang: str, model: str) -> str:
+    raw = "\0".join((normalize_text(text), target_lang, model))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TranslationCache:
+    def __init__(
+        self,
+        path: Path | str = DEFAULT_PATH,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl: float = DEFAULT_TTL,
+    ) -> None:
+        self._store = SqliteLruStore(path, "translations", max_entries, ttl, value_column="translation")
+
+    @property
+    def hits(self) -> int:
+        return self._store.hits
+
+    @property
+    def misses(self) -> int:
+        return self._store.misses
+
+    def close(self) -> None:
+        self._store.close()
+
+    def get(self, text: str, target_lang: str, model: str) -> str | None:
+        return self._store.get(cache_key(text, target_lang, model))
+
+    def put(self, text: str, target_lang: str, model: str, translation: str) -> None:
+        self._store.put(cache_key(text, target_lang, model), translation)
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        return f"Translation cache: {self.hits} hit(s), {self.misses} miss(es) ({rate:.0f}% hit rate)"
@@ -5,11 +5,21 @@ import sys
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
 from common.gemini import GeminiClient
+from common.llm_retry import estimate_tokens
+from translation_cache import TranslationCache
 
 _HAN_RE = re.compile(r"[㐀-䶿一-鿿]")
 _KANA_RE = re.compile(r"[぀-ヿ]")
 _FOREIGN_WORD_RE = re.compile(r"[^\W\d_]+")
 
+# translate_batch 每批的輸入 token 預算與筆數上限
+BATCH_TOKEN_BUDGET = 6000
+BATCH_MAX_ITEMS = 20
+# 批次解析失敗後逐則重試的並行數
+FALLBACK_CONCURRENCY = 4
+
+_BATCH_ITEM_RE = re.compile(r"<<<(\d+)>>>\s*(.*?)\s*<<<END \1>>>", re.S)
+
 # 一個漢字約等於一個詞，故以「漢字數 vs 外文單字數」比較；
 # 漢字佔比達此門檻即視為中文（容忍中英夾雜的貼文）
 _HAN_RATIO_THRESHOLD = 0.5
@@ -26,15 +36,113 @@ def is_chinese(text: str) -> bool:
     return han / (han + foreign_words) >= _HAN_RATIO_THRESHOLD
 
 
+def split_batches(texts: list[str], token_budget: int = BATCH_TOKEN_BUDGET,
+                  max_items: int = BATCH_MAX_ITEMS) -> list[list[int]]:
+    """依 token 預算把 texts 切成多批，回傳每批的索引；超過預算的單筆自成一批。"""
+    batches: list[list[int]] = []
+    current: list[int] = []
+    used = 0
+    for i, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        if current and (used + cost > token_budget or len(current) >= max_items):
+            batches.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def parse_batch_reply(reply: str) -> dict[int, str]:
+    return {int(m.group(1)): m.group(2) for m in _BATCH_ITEM_RE.finditer(reply) if m.group(2)}
+
+
+TARGET_LANG = "zh-TW"
+
+
 class Translator:
-    def __init__(self, gemini: GeminiClient) -> None:
+    def __init__(self, gemini: GeminiClient, cache: TranslationCache | None = None) -> None:
         self.gemini = gemini
+        self.cache = cache
+        self.model = f"{'cli' if gemini.use_cli else 'api'}:{gemini.model_name}"
 
     def translate_to_chinese(self, text: str) -> str:
-        prompt = (
+        cached = self._cached(text)
+        if cached is not None:
+            return cached
+        return self._translate(text)
+
+    def _translate(self, text: str) -> str:
+        translation = self.gemini.generate(self._prompt(text))
+        self._store(text, translation)
+        return translation
+
+    @staticmethod
+    def _prompt(text: str) -> str:
+        return (
             "請將以下社群貼文內容翻譯成繁體中文（台灣用語）。"
             "只輸出翻譯結果，不要加任何說明或前綴。"
             "保留原文中的 hashtag、@提及與網址不翻譯。\n\n"
             f"{text}"
         )
-        return self.gemini.generate(prompt)
+
+    def _cached(self, text: str) -> str | None:
+        if self.cache is None:
+            return None
+        return self.cache.get(text, TARGET_LANG, self.model)
+
+    def _store(self, text: str, translation: str) -> None:
+        if self.cache is not None and translation:
+            self.cache.put(text, TARGET_LANG, self.model, translation)
+
+    def translate_batch(self, texts: list[str]) -> list[str | None]:
+        """一次請求翻譯多則貼文，回傳與輸入同順序的譯文。
+
+        以 <<<n>>> … <<<END n>>> 分隔每則貼文並要求模型照樣輸出；整批失敗或某則
+        解析不到時改為逐則並行翻譯，仍失敗的回傳 None。已在快取中的貼文不會送出。
+        """
+        results: list[str | None] = [self._cached(text) for text in texts]
+        pending = [i for i, cached in enumerate(results) if cached is None]
+        for batch in split_batches([texts[i] for i in pending]):
+            batch = [pending[j] for j in batch]
+            parsed: dict[int, str] = {}
+            if len(batch) > 1:
+                try:
+                    parsed = parse_batch_reply(self.gemini.generate(self._batch_prompt([texts[i] for i in batch])))
+                except Exception as e:
+                    print(f"  Batch translate error ({len(batch)} posts): {e}", file=sys.stderr)
+
+            retry: list[int] = []
+            for n, i in enumerate(batch, start=1):
+                if n in parsed:
+                    results[i] = parsed[n]
+                    self._store(texts[i], parsed[n])
+                else:
+                    retry.append(i)
+
+            if not retry:
+                continue
+            replies = self.gemini.generate_many(
+                [self._prompt(texts[i]) for i in retry],
+                max_concurrency=FALLBACK_CONCURRENCY,
+                return_exceptions=True,
+            )
+            for i, reply in zip(retry, replies):
+                if isinstance(reply, BaseException):
+                    print(f"  Translate error: {reply}", file=sys.stderr)
+                    continue
+                results[i] = reply
+                self._store(texts[i], reply)
+        return results
+
+    @staticmethod
+    def _batch_prompt(texts: list[str]) -> str:
+        items = "\n\n".join(f"<<<{n}>>>\n{text}\n<<<END {n}>>>" for n, text in enumerate(texts, start=1))
+        return (
+            "請將以下每則社群貼文分別翻譯成繁體中文（台灣用語）。"
+            "保留原文中的 hashtag、@提及與網址不翻譯。\n"
+            "每則貼文以 <<<編號>>> 開頭、<<<END 編號>>> 結尾；"
+            "請用完全相同的標記與編號包住每則譯文，依序輸出，不要加任何說明。\n\n"
+            f"{items}"
+        )